@@ -0,0 +1,85 @@
+"""
+Checks that a run resumed from a checkpoint ends exactly like an
+uninterrupted one.
+
+For every update mode and precision of the firefly engine (and the
+asynchronous mode with the surrogate screen, see `surrogate`) and for the other
+iterative engines (see `engines`), one run goes through all iterations and
+another, with the same seed, is cancelled after `--stop-after` iterations
+(saving its checkpoint, see `FireFly.save_checkpoint`) and resumed by a new
+`FireFly` with `resume=True`. The script reports whether the optimized
+windows, the PSLR histories, the evaluation counts and the surrogate reports
+are identical, and exits with status 1 if they are not.
+
+    python benchmarks/checkpoint_resume.py --window-length 32 --iterations 20 --stop-after 7
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import optimizer as opt  # noqa: E402
+
+
+def run(args, engine, update_mode, precision, surrogate, checkpoint_path=None, stop_after=None):
+    """
+    Returns the optimized window, PSLR history, evaluation count and surrogate
+    report of one run, cancelled after `stop_after` iterations if given.
+    """
+    cancel_token = opt.CancellationToken()
+
+    def stop(iteration, history, window):
+        if iteration == stop_after:
+            cancel_token.cancel()
+
+    firefly = opt.FireFly(args.window_length, args.beta, args.freq_resolution, args.fireflies, args.iterations,
+                          0.15, 0.1, 10, update_mode=update_mode, precision=precision, surrogate=surrogate,
+                          engine=engine, seed=args.seed, cancel_token=cancel_token, iteration_callback=stop,
+                          checkpoint_path=checkpoint_path, checkpoint_interval=args.checkpoint_interval,
+                          resume=checkpoint_path is not None)
+    _, window_optimized = firefly.optimizer()
+
+    return window_optimized, list(firefly.history), firefly.n_evaluations, firefly.run_report().get("surrogate")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--window-length", type=int, default=32)
+    parser.add_argument("--beta", type=float, default=2.25)
+    parser.add_argument("--freq-resolution", type=int, default=1024)
+    parser.add_argument("--fireflies", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--stop-after", type=int, default=7, help="iterations before the first run is cancelled")
+    parser.add_argument("--checkpoint-interval", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    failed = False
+    cases = [("firefly", update_mode, precision, False)
+             for update_mode in opt.update_modes for precision in opt.precisions]
+    cases += [("firefly", "async", precision, True) for precision in opt.precisions]
+    cases += [(engine, "async", precision, False) for engine in ("pso", "de", "cmaes") for precision in opt.precisions]
+    print(f"{'engine':>7} {'mode':>6} {'precision':>10} {'surrogate':>10} {'window':>7} {'history':>8} "
+          f"{'evaluations':>12} {'report':>7}")
+    for case in cases:
+        expected = run(args, *case)
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint_path = os.path.join(directory, "checkpoint.npz")
+            run(args, *case, checkpoint_path, args.stop_after)
+            resumed = run(args, *case, checkpoint_path)
+
+        same = (np.array_equal(expected[0], resumed[0]),) + tuple(a == b for a, b in zip(expected[1:], resumed[1:]))
+        failed |= not all(same)
+        engine, update_mode, precision, surrogate = case
+        print(f"{engine:>7} {update_mode:>6} {precision:>10} {'yes' if surrogate else 'no':>10} "
+              + " ".join(f"{'same' if ok else 'DIFFERS':>{width}}" for ok, width in zip(same, (7, 8, 12, 7))))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Checks the "cosine" response engine against `freqz`.
+
+For every window length and grid size, a population scattered around the
+Kaiser window is evaluated with the cosine engine (`FireFly.calculate_response_batch`
+and `FireFly.objective_batch`) and one window at a time through `freqz`
+(`FireFly.calculate_response` and `FireFly.objective` of the FFT engine). The
+script reports the largest difference of the linear magnitude responses and of
+the objective values, and exits with status 1 if one exceeds its tolerance. A
+small `--memory-budget` checks the streamed evaluation of large grids
+(`FireFly._objective_cosine`).
+
+    python benchmarks/cosine_engine.py --window-length 16 64 256 --freq-resolution 512 4096
+    python benchmarks/cosine_engine.py --window-length 64 --freq-resolution 65536 --memory-budget 1
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import optimizer as opt  # noqa: E402
+
+
+def response_error(cosine, reference, population):
+    """
+    Returns the largest difference of the magnitude responses (normalized to
+    a peak of 1) of the cosine engine and freqz.
+    """
+    responses = 10 ** (cosine.calculate_response_batch(population) / 20)
+    expected = 10 ** (np.array([reference.calculate_response(reference.symmetric_window(half))[1]
+                                for half in population]) / 20)
+    return np.max(np.abs(responses - expected))
+
+
+def objective_error(cosine, reference, population):
+    """
+    Returns the largest difference (dB) of the objective values of the cosine
+    engine and freqz.
+    """
+    objective = cosine.objective_batch(population)
+    expected = np.array([reference.objective(half) for half in population])
+    return np.max(np.abs(objective - expected))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--window-length", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--freq-resolution", type=int, nargs="+", default=[512, 4096])
+    parser.add_argument("--beta", type=float, default=2.25)
+    parser.add_argument("--fireflies", type=int, default=20)
+    parser.add_argument("--spread", type=float, default=0.3, help="uniform perturbation of the Kaiser window")
+    parser.add_argument("--response-tolerance", type=float, default=1e-9)
+    parser.add_argument("--objective-tolerance", type=float, default=1e-6, help="dB")
+    parser.add_argument("--memory-budget", type=float, default=opt.default_memory_budget / 2 ** 20,
+                        help="MiB of the cosine engine")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    failed = False
+    print(f"{'L':>5} {'N':>7} {'response':>10} {'objective dB':>13}")
+    for L in args.window_length:
+        for N in args.freq_resolution:
+            if N < opt.min_points_per_sample * L:
+                continue
+            cosine = opt.FireFly(L, args.beta, N, args.fireflies, 1, 0.15, 0.1, 10, response_engine="cosine",
+                                 memory_budget=int(args.memory_budget * 2 ** 20))
+            reference = opt.FireFly(L, args.beta, N, args.fireflies, 1, 0.15, 0.1, 10)
+            rng = np.random.default_rng(args.seed)
+            population = np.clip(cosine.window[:L // 2] + args.spread * (rng.random((args.fireflies, L // 2)) - 0.5),
+                                 0, 1)
+
+            errors = response_error(cosine, reference, population), objective_error(cosine, reference, population)
+            ok = errors[0] <= args.response_tolerance and errors[1] <= args.objective_tolerance
+            failed |= not ok
+            print(f"{L:>5} {N:>7} {errors[0]:>10.2g} {errors[1]:>13.2g} {'' if ok else 'FAILED'}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
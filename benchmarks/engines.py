@@ -0,0 +1,100 @@
+"""
+Compares the search engines of `FireFly` (see `engines`) on one design.
+
+Every engine runs from the same seeds until the PSLR of its best window
+reaches the target, or until the evaluation budget is used up. The report
+lists per engine how many runs reached the target, the median objective
+evaluations and wall-clock time to the target, and the median PSLR and
+mainlobe width (relative to the rectangular window) of the final windows; the
+objective trades both through `--lambda`.
+
+    python benchmarks/engines.py --window-length 64 --target-pslr -30 --seeds 5
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import optimizer as opt  # noqa: E402
+
+
+def run_engine(engine, seed, args):
+    """
+    Returns the run report of `engine` with the evaluations and seconds at
+    which the best PSLR reached the target (None if it did not) and the final
+    MW and PSLR.
+    """
+    cancel_token = opt.CancellationToken()
+    reached = {}
+
+    def check_target(iteration, history, window):
+        if history[-1] <= args.target_pslr:
+            reached.update(firefly.run_report())
+            cancel_token.cancel()
+
+    firefly = opt.FireFly(args.window_length, args.beta, args.freq_resolution, args.fireflies, args.iterations,
+                          args.gamma, args.alpha, args.lamda, update_mode=args.update_mode, engine=engine,
+                          seed=seed, max_evaluations=args.max_evaluations, cancel_token=cancel_token,
+                          iteration_callback=check_target)
+    _, window_optimized = firefly.optimizer()
+    report = firefly.run_report()
+    mw, pslr, _ = firefly.calculate_MW_PSLR_PL(window_optimized)
+    report.update(mw=float(mw), pslr=float(pslr), evaluations_to_target=reached.get("evaluations"),
+                  seconds_to_target=reached.get("seconds"))
+
+    return report
+
+
+def median(values):
+    return float(np.median(values)) if values else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--engines", nargs="+", choices=opt.search_engines, default=list(opt.search_engines))
+    parser.add_argument("--window-length", type=int, default=64)
+    parser.add_argument("--beta", type=float, default=2.25)
+    parser.add_argument("--freq-resolution", type=int, default=1024)
+    parser.add_argument("--fireflies", type=int, default=40)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--gamma", type=float, default=0.15)
+    parser.add_argument("--alpha", type=float, default=0.1)
+    parser.add_argument("--lambda", dest="lamda", type=float, default=10)
+    parser.add_argument("--update-mode", choices=opt.update_modes, default="async", help="of the firefly engine")
+    parser.add_argument("--target-pslr", type=float, default=None,
+                        help="PSLR (dB) to reach, by default 3 dB below the Kaiser window")
+    parser.add_argument("--max-evaluations", type=int, default=20000, help="evaluation budget of every run")
+    parser.add_argument("--seeds", type=int, default=3, help="runs per engine, with seeds 0, 1, ...")
+    parser.add_argument("--output", default=None, help="also write every run to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.target_pslr is None:
+        kaiser = opt.FireFly(args.window_length, args.beta, args.freq_resolution, args.fireflies, 1,
+                             args.gamma, args.alpha, args.lamda)
+        args.target_pslr = round(kaiser.calculate_pslr(kaiser.window)[1] - 3, 2)
+    print(f"Target PSLR {args.target_pslr} dB, budget {args.max_evaluations} evaluations, {args.seeds} seeds")
+
+    runs = {}
+    print(f"{'engine':>8} {'reached':>8} {'evaluations':>12} {'seconds':>9} {'PSLR dB':>9} {'MW':>6}")
+    for engine in args.engines:
+        runs[engine] = [run_engine(engine, seed, args) for seed in range(args.seeds)]
+        reached = [run for run in runs[engine] if run["evaluations_to_target"] is not None]
+        evaluations = median([run["evaluations_to_target"] for run in reached])
+        seconds = median([run["seconds_to_target"] for run in reached])
+        print(f"{engine:>8} {len(reached):>4}/{args.seeds:<3} "
+              f"{'-' if evaluations is None else f'{evaluations:.0f}':>12} "
+              f"{'-' if seconds is None else f'{seconds:.3f}':>9} "
+              f"{median([run['pslr'] for run in runs[engine]]):>9.2f} "
+              f"{median([run['mw'] for run in runs[engine]]):>6.2f}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"arguments": vars(args), "runs": runs}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Benchmark suite of the optimizer hot paths.
+
+`run` times microbenchmarks of the `FireFly` methods (`calculate_response`,
+`calculate_pslr`, `calculate_mw`, `objective`, `initialize_fireflies` and one
+iteration in each update mode) and end-to-end `optimizer()` runs over a matrix
+of window lengths, population sizes and frequency grids, and writes the
+timings to JSON. `compare` checks such a file against a stored baseline and
+exits with status 1 if a benchmark got slower than the threshold allows.
+
+    python benchmarks/suite.py run --output results.json
+    python benchmarks/suite.py compare benchmarks/baseline.json results.json
+
+Timings depend on the machine: record a baseline on the machine that runs
+the comparison (`run --output benchmarks/baseline.json`). Only numpy and
+scipy are needed, no Qt or display.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+
+import numpy as np
+import scipy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import optimizer as opt  # noqa: E402
+
+# Parameter matrices of the presets: window lengths and grids of the
+# microbenchmarks, and window lengths, population sizes and grids of the
+# end-to-end runs.
+presets = {
+    "quick": {"micro_lengths": (64, 1024), "micro_resolutions": (1024, 16384),
+              "lengths": (32, 256), "populations": (10, 100), "resolutions": (1024, 4096)},
+    "full": {"micro_lengths": (32, 256, 4096), "micro_resolutions": (256, 4096, 65536),
+             "lengths": (32, 256, 4096), "populations": (10, 100, 500), "resolutions": (256, 4096, 65536)},
+}
+# Fixed FireFly arguments of all benchmarks
+firefly_args = dict(beta=2.25, gamma=0.15, alpha=0.1, lamda=10, seed=0)
+# Population size of the iteration microbenchmarks (the async update costs n_pop^2 evaluations)
+iteration_populations = {"async": 20, "sync": 100}
+
+default_baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def time_call(function, repeats):
+    """
+    Returns the best time of one call of `function` over `repeats` repeats,
+    each averaged over as many calls as fit into about 0.2 seconds.
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeats, number=number)) / number
+
+
+def micro_benchmarks(preset, repeats):
+    for L in preset["micro_lengths"]:
+        for N in preset["micro_resolutions"]:
+            if N < opt.min_points_per_sample * L:
+                continue
+            firefly = opt.FireFly(L, freqResolution=N, n_pop=iteration_populations["sync"], max_iter=1,
+                                  **firefly_args)
+            window = firefly.window
+            half = window[:L // 2].copy()
+            params = {"L": L, "freqResolution": N}
+            yield "calculate_response", params, time_call(lambda: firefly.calculate_response(window), repeats)
+            yield "calculate_pslr", params, time_call(lambda: firefly.calculate_pslr(window), repeats)
+            yield "calculate_mw", params, time_call(lambda: firefly.calculate_mw(window), repeats)
+            yield "objective", params, time_call(lambda: firefly.objective(half), repeats)
+
+            for mode, n_pop in iteration_populations.items():
+                firefly = opt.FireFly(L, freqResolution=N, n_pop=n_pop, max_iter=1, update_mode=mode,
+                                      **firefly_args)
+                population = firefly.initialize_fireflies(firefly.window)
+                fitness = firefly.objective_batch(population)
+
+                def iteration():
+                    firefly.iterate(population.copy(), fitness.copy(), firefly.alpha, 0)
+
+                yield f"iteration_{mode}", dict(params, n_pop=n_pop), time_call(iteration, repeats)
+
+        firefly = opt.FireFly(L, freqResolution=opt.min_points_per_sample * L, n_pop=iteration_populations["sync"], max_iter=1,
+                              **firefly_args)
+        yield ("initialize_fireflies", {"L": L, "n_pop": firefly.n_pop},
+               time_call(lambda: firefly.initialize_fireflies(firefly.window), repeats))
+
+
+def end_to_end_benchmarks(preset, repeats, iterations, update_mode):
+    for L in preset["lengths"]:
+        for n_pop in preset["populations"]:
+            for N in preset["resolutions"]:
+                if N < opt.min_points_per_sample * L:
+                    continue
+                params = {"L": L, "n_pop": n_pop, "freqResolution": N, "max_iter": iterations,
+                          "update_mode": update_mode}
+                seconds = []
+                for _ in range(repeats):
+                    firefly = opt.FireFly(L, freqResolution=N, n_pop=n_pop, max_iter=iterations,
+                                          update_mode=update_mode, **firefly_args)
+                    start = time.perf_counter()
+                    firefly.optimizer()
+                    seconds.append(time.perf_counter() - start)
+                yield "optimizer", params, min(seconds)
+
+
+def benchmark_name(group, name, params):
+    return f"{group}/{name}/" + ",".join(f"{key}={value}" for key, value in params.items())
+
+
+def run(args):
+    preset = presets[args.preset]
+    benchmarks = []
+    if args.group in ("all", "micro"):
+        benchmarks.append(("micro", micro_benchmarks(preset, args.repeats)))
+    if args.group in ("all", "e2e"):
+        benchmarks.append(("e2e", end_to_end_benchmarks(preset, args.e2e_repeats, args.iterations,
+                                                        args.update_mode)))
+
+    results = {}
+    for group, runs in benchmarks:
+        for name, params, seconds in runs:
+            key = benchmark_name(group, name, params)
+            results[key] = {"group": group, "name": name, "params": params, "seconds": seconds}
+            print(f"{key:<80} {seconds * 1e3:>12.3f} ms", file=sys.stderr)
+
+    report = {
+        "meta": {"created": datetime.datetime.now().isoformat(timespec="seconds"), "preset": args.preset,
+                 "python": platform.python_version(), "numpy": np.__version__, "scipy": scipy.__version__,
+                 "machine": platform.machine(), "processor": platform.processor(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    return 0
+
+
+def compare(args):
+    with open(args.baseline) as file:
+        baseline = json.load(file)["results"]
+    with open(args.current) as file:
+        current = json.load(file)["results"]
+
+    regressions = 0
+    print(f"{'benchmark':<80} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}")
+    for key in sorted(set(baseline) | set(current)):
+        if key not in current or key not in baseline:
+            print(f"{key:<80} {'only in ' + ('baseline' if key in baseline else 'current'):>33}")
+            continue
+        before, after = baseline[key]["seconds"], current[key]["seconds"]
+        ratio = after / before
+        flag = ""
+        if ratio > 1 + args.threshold:
+            flag = "REGRESSION"
+            regressions += 1
+        elif ratio < 1 - args.threshold:
+            flag = "faster"
+        print(f"{key:<80} {before * 1e3:>12.3f} {after * 1e3:>12.3f} {ratio:>7.2f} {flag}")
+
+    print(f"{regressions} regression(s) above {args.threshold:.0%}.")
+    return 1 if regressions else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the Kaiser window optimizer.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks and write the timings to JSON")
+    run_parser.add_argument("--preset", choices=presets, default="quick")
+    run_parser.add_argument("--group", choices=("all", "micro", "e2e"), default="all")
+    run_parser.add_argument("--repeats", type=int, default=7, help="repeats of every microbenchmark")
+    run_parser.add_argument("--e2e-repeats", type=int, default=1, help="repeats of every end-to-end run")
+    run_parser.add_argument("--iterations", type=int, default=5, help="iterations of the end-to-end runs")
+    run_parser.add_argument("--update-mode", choices=opt.update_modes, default="sync",
+                            help="update mode of the end-to-end runs")
+    run_parser.add_argument("--output", default="benchmark_results.json")
+    run_parser.set_defaults(function=run)
+
+    compare_parser = commands.add_parser("compare", help="flag regressions against a baseline")
+    compare_parser.add_argument("baseline", nargs="?", default=default_baseline)
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.25,
+                                help="relative slowdown reported as a regression")
+    compare_parser.set_defaults(function=compare)
+
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    sys.exit(args.function(args))
@@ -0,0 +1,70 @@
+"""
+Compares the "zoom" response engine with the uniform FFT grid.
+
+For every window length and grid size, a population scattered around the
+Kaiser window is evaluated with both engines. The script reports the time per
+`FireFly.objective_batch` call and the largest PSLR difference of either engine
+to `freqz` on the same uniform grid (`FireFly.calculate_pslr`).
+
+    python benchmarks/zoom_engine.py --window-length 32 64 128 --freq-resolution 1024 4096 16384
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import optimizer as opt  # noqa: E402
+
+
+def time_objective(firefly, population, repeats):
+    firefly.objective_batch(population)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        firefly.objective_batch(population)
+    return (time.perf_counter() - start) / repeats
+
+
+def pslr_error(firefly, population):
+    """
+    Returns the largest PSLR difference (dB) of the engine of `firefly` to freqz.
+    """
+    pslr, _ = firefly.metrics_from_response_batch(firefly.calculate_response_batch(population), population,
+                                                  firefly.response_frequencies())
+    reference = [firefly.calculate_pslr(firefly.symmetric_window(half))[1] for half in population]
+    return np.max(np.abs(pslr - reference))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--window-length", type=int, nargs="+", default=[32, 64, 128])
+    parser.add_argument("--freq-resolution", type=int, nargs="+", default=[1024, 4096, 16384])
+    parser.add_argument("--beta", type=float, default=2.25)
+    parser.add_argument("--fireflies", type=int, default=100)
+    parser.add_argument("--spread", type=float, default=0.3, help="uniform perturbation of the Kaiser window")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print(f"{'L':>5} {'N':>7} {'fft ms':>9} {'zoom ms':>9} {'speedup':>8} {'fft dB':>9} {'zoom dB':>9}")
+    for L in args.window_length:
+        for N in args.freq_resolution:
+            if N < opt.min_points_per_sample * L:
+                continue
+            fireflies = {engine: opt.FireFly(L, args.beta, N, args.fireflies, 1, 0.15, 0.1, 10, response_engine=engine)
+                         for engine in ("fft", "zoom")}
+            kaiser = fireflies["fft"].window[:L // 2]
+            rng = np.random.default_rng(args.seed)
+            population = kaiser + args.spread * rng.random((args.fireflies, L // 2))
+
+            seconds = {engine: time_objective(firefly, population, args.repeats) for engine, firefly in fireflies.items()}
+            errors = {engine: pslr_error(firefly, population) for engine, firefly in fireflies.items()}
+            print(f"{L:>5} {N:>7} {seconds['fft'] * 1e3:>9.2f} {seconds['zoom'] * 1e3:>9.2f} "
+                  f"{seconds['fft'] / seconds['zoom']:>8.2f} {errors['fft']:>9.2g} {errors['zoom']:>9.2g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+import optimizer as opt
+
+# Modules whose source determines the result of an optimization
+versioned_modules = ("optimizer.py", "islands.py", "engines.py", "surrogate.py")
+
+
+def code_version():
+    """
+    Returns a hash of the source of `versioned_modules`, so that cached results
+    are invalidated whenever the optimizer code changes.
+    """
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(opt.__file__))
+    for name in versioned_modules:
+        with open(os.path.join(directory, name), "rb") as file:
+            digest.update(file.read())
+
+    return digest.hexdigest()[:16]
+
+
+def design_metrics(firefly_algorithm, window, window_optimized):
+    """
+    Returns the MW, PSLR and PL of the Kaiser and the optimized window, as
+    reported by `FireFly.calculate_MW_PSLR_PL`.
+    """
+    return {
+        "kaiser": [float(value) for value in firefly_algorithm.calculate_MW_PSLR_PL(window)],
+        "optimized": [float(value) for value in firefly_algorithm.calculate_MW_PSLR_PL(window_optimized)],
+    }
+
+
+class ResultCache:
+    """
+    On-disk cache of optimized windows, keyed by a hash of the optimization
+    parameters (every `FireFly` constructor argument including the seed, see
+    `FireFly.get_params`) and the code version.
+
+    Every entry is one `.npz` file holding the Kaiser and the optimized window
+    and their metrics. When the files exceed `max_bytes`, the least recently
+    used ones are deleted; a hit refreshes the modification time of its file.
+
+    Args:
+        directory: Cache directory, by default `$KAISER_CACHE_DIR` or
+            `~/.cache/kaiser_optimizer`.
+        max_bytes: Size limit of the cache directory.
+    """
+
+    def __init__(self, directory=None, max_bytes=64 * 2 ** 20):
+        self.directory = directory or os.getenv(
+            "KAISER_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "kaiser_optimizer"))
+        self.max_bytes = max_bytes
+        self.version = code_version()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, params):
+        # The number of worker processes and the memory budget do not change the result.
+        params = {name: value for name, value in params.items() if name not in ("n_workers", "memory_budget")}
+        text = json.dumps({"params": params, "version": self.version}, sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def path(self, params):
+        return os.path.join(self.directory, self.key(params) + ".npz")
+
+    def get(self, params):
+        """
+        Returns the cached entry for `params`, or None on a miss. An entry is a
+        dict with `window`, `window_optimized`, `metrics`, `params` and the
+        `report` of the run that produced it (see `FireFly.run_report`).
+        """
+        path = self.path(params)
+        try:
+            with np.load(path) as data:
+                entry = {"window": data["window"], "window_optimized": data["window_optimized"]}
+                entry.update(json.loads(str(data["meta"])))
+            os.utime(path)
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None
+
+        return entry
+
+    def put(self, params, entry):
+        """
+        Stores `entry` (see `get`) under `params` and evicts old entries.
+        """
+        meta = json.dumps({"params": params, "metrics": entry["metrics"], "report": entry["report"]})
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(handle, "wb") as file:
+            np.savez(file, window=entry["window"], window_optimized=entry["window_optimized"], meta=meta)
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, self.path(params))
+        self.evict()
+
+    def entries(self):
+        """
+        Returns `(path, size, mtime)` of every entry, least recently used first.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((os.path.join(self.directory, name), stat.st_size, stat.st_mtime))
+
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def nearest(self, params, count):
+        """
+        Returns the optimized windows of the `count` stored designs with the
+        same `lamda` whose `(L, beta)` are closest to those of `params`.
+
+        The distance adds the octaves between the window lengths and the
+        difference of the betas, so designs of the same `(L, beta)` with other
+        search settings come first.
+        """
+        candidates = []
+        for path, _, _ in self.entries():
+            try:
+                with np.load(path) as data:
+                    meta = json.loads(str(data["meta"]))
+                    if meta["params"]["lamda"] != params["lamda"]:
+                        continue
+                    window = data["window_optimized"]
+            except (FileNotFoundError, KeyError, ValueError, OSError):
+                continue
+            distance = abs(np.log2(meta["params"]["L"] / params["L"])) + abs(meta["params"]["beta"] - params["beta"])
+            candidates.append((distance, path, window))
+
+        return [window for _, _, window in sorted(candidates, key=lambda candidate: candidate[:2])[:count]]
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def run_cached(firefly_algorithm, cache, run=None, warm_start_designs=0, **extra_params):
+    """
+    Returns the result of `firefly_algorithm` from `cache`, or optimizes and
+    stores it on a miss. A cancelled run is not stored. An unseeded run
+    (`seed=None`) is a fresh random draw each time, so it is neither looked up
+    nor stored.
+
+    With `warm_start_designs`, a miss seeds the initial population with the
+    optimized windows of up to that many neighbouring designs from the cache
+    (`ResultCache.nearest`, see `FireFly.warm_start_windows`). The setting is
+    part of the cache key; which designs were used is not.
+
+    Args:
+        firefly_algorithm: The configured FireFly.
+        cache: A ResultCache, or None to always optimize.
+        run: Function returning `(window, window_optimized)`, by default
+            `firefly_algorithm.optimizer`.
+        warm_start_designs: Number of cached designs seeding the population.
+        extra_params: Parameters of `run` beyond the FireFly ones (for example
+            the island model settings), added to the cache key.
+
+    Returns:
+        The entry (see `ResultCache.get`) and whether it came from the cache.
+    """
+    if warm_start_designs:
+        extra_params["warm_start_designs"] = warm_start_designs
+    params = dict(firefly_algorithm.get_params(), **extra_params)
+    seeded = firefly_algorithm.seed is not None
+    entry = cache.get(params) if cache is not None and seeded else None
+    if entry is not None:
+        firefly_algorithm.window_optimized = entry["window_optimized"][:firefly_algorithm.L // 2]
+        return entry, True
+    if warm_start_designs and cache is not None:
+        firefly_algorithm.seed_windows = cache.nearest(params, warm_start_designs)
+
+    window, window_optimized = (run or firefly_algorithm.optimizer)()
+    entry = {"window": window, "window_optimized": window_optimized, "params": params,
+             "metrics": design_metrics(firefly_algorithm, window, window_optimized),
+             "report": firefly_algorithm.run_report()}
+    if cache is not None and seeded and not firefly_algorithm.is_cancelled():
+        cache.put(params, entry)
+
+    return entry, False
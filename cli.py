@@ -0,0 +1,164 @@
+import argparse
+import json
+import os
+import signal
+import sys
+
+import numpy as np
+
+import optimizer as opt
+from cache import ResultCache, run_cached
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Optimize a Kaiser window with the Firefly Algorithm (headless, no GUI).")
+    parser.add_argument("--window-length", type=int, default=64, help="window length L (even)")
+    parser.add_argument("--beta", type=float, default=2.25, help="Kaiser beta")
+    parser.add_argument("--freq-resolution", type=int, default=1024, help="number of frequency points, at least 4 * window length")
+    parser.add_argument("--fireflies", type=int, default=100, help="number of fireflies")
+    parser.add_argument("--iterations", type=int, default=100, help="number of iterations")
+    parser.add_argument("--gamma", type=float, default=0.15, help="light absorption coefficient")
+    parser.add_argument("--alpha", type=float, default=0.1, help="randomization parameter")
+    parser.add_argument("--lambda", dest="lamda", type=float, default=10, help="mainlobe width penalty weight")
+    parser.add_argument("--min-freq-resolution", type=int, default=None,
+                        help="start on this coarser frequency grid and refine it towards --freq-resolution")
+    parser.add_argument("--refine-peaks", action="store_true",
+                        help="locate sidelobe peaks between grid points (accurate PSLR on coarse grids)")
+    parser.add_argument("--interpolate-mw", action="store_true",
+                        help="measure the mainlobe width at the interpolated -3 dB crossing instead of counting bins")
+    parser.add_argument("--precision", choices=opt.precisions, default="float64",
+                        help="floating-point type of the search loop (results are reported in float64)")
+    parser.add_argument("--memory-budget", type=float, default=opt.default_memory_budget / 2 ** 20,
+                        help="MiB of temporary arrays per process when evaluating and moving the population")
+    parser.add_argument("--engine", choices=opt.search_engines, default="firefly",
+                        help="search strategy: firefly algorithm, particle swarm, differential evolution, CMA-ES "
+                             "or the direct minimax design by linear programming")
+    parser.add_argument("--warm-start", action="store_true",
+                        help="seed the population with the direct minimax design")
+    parser.add_argument("--warm-start-designs", type=int, default=0,
+                        help="seed the population with this many cached designs of the nearest window length and beta")
+    parser.add_argument("--polish", action="store_true",
+                        help="refine the best window with a gradient method on a smooth PSLR surrogate")
+    parser.add_argument("--surrogate", action="store_true",
+                        help="skip firefly moves that an RBF model of the objective predicts to be clearly worse "
+                             "(async update mode)")
+    parser.add_argument("--update-mode", choices=opt.update_modes, default="async")
+    parser.add_argument("--response-engine", choices=opt.response_engines, default="fft")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=1, help="processes used to evaluate the population (sync update mode or another engine)")
+    parser.add_argument("--islands", type=int, default=0, help="run an island model with this many swarms")
+    parser.add_argument("--migration-interval", type=int, default=10)
+    parser.add_argument("--stagnation-iter", type=int, default=None,
+                        help="stop when the best PSLR did not improve for this many iterations")
+    parser.add_argument("--target-pslr", type=float, default=None, help="stop once this PSLR (dB) is reached")
+    parser.add_argument("--max-evaluations", type=int, default=None, help="objective evaluation budget")
+    parser.add_argument("--time-limit", type=float, default=None, help="wall-clock budget in seconds")
+    parser.add_argument("--output-dir", default=os.getenv("SAVE_DIR", "./"),
+                        help="directory for window.txt and results.json")
+    parser.add_argument("--cache-dir", default=None, help="result cache directory (default: $KAISER_CACHE_DIR)")
+    parser.add_argument("--no-cache", action="store_true", help="always optimize, do not read or write the cache")
+    parser.add_argument("--checkpoint", default=None,
+                        help="save the state of the search to this file, to continue it later with --resume")
+    parser.add_argument("--checkpoint-interval", type=int, default=10, help="iterations between two checkpoints")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue from --checkpoint if it exists (same parameters required)")
+    parser.add_argument("--profile", action="store_true",
+                        help="record the time of every phase of the run and add it to results.json")
+    parser.add_argument("--quiet", action="store_true", help="do not print progress")
+    args = parser.parse_args(argv)
+
+    errors = check_args(args)
+    if errors:
+        parser.error(" ".join(errors))
+
+    return args
+
+
+def check_args(args):
+    """
+    Applies the input checks of the GUI (`MyWindow.check_input`).
+    """
+    errors = []
+    for name in ("alpha", "gamma", "iterations", "fireflies", "window_length", "beta", "freq_resolution"):
+        if getattr(args, name) == 0:
+            errors.append(f"{name} can not be zero.")
+    if args.window_length % 2 == 1:
+        errors.append("window_length can not be odd.")
+    if 0 < args.freq_resolution < opt.min_points_per_sample * args.window_length:
+        errors.append(f"freq_resolution must be at least {opt.min_points_per_sample} * window_length.")
+    if args.resume and args.checkpoint is None:
+        errors.append("--resume needs --checkpoint.")
+    if args.checkpoint is not None and args.islands:
+        errors.append("--checkpoint is not supported with --islands.")
+    if args.surrogate and args.islands:
+        errors.append("--surrogate is not supported with --islands.")
+    if args.engine != "firefly" and args.islands:
+        errors.append("--islands needs --engine firefly.")
+    if args.engine == "direct" and args.checkpoint is not None:
+        errors.append("--checkpoint needs an iterative --engine, not direct.")
+    if args.workers > 1 and args.engine == "firefly" and args.update_mode == "async":
+        errors.append("--workers needs --update-mode sync with the firefly engine.")
+    if args.checkpoint_interval <= 0:
+        errors.append("checkpoint_interval must be positive.")
+
+    return errors
+
+
+def print_progress(value):
+    print(f"\rProcessing: {value}%", end="", file=sys.stderr, flush=True)
+
+
+def run(args):
+    cancel_token = opt.CancellationToken()
+    # SIGTERM is what `docker stop` sends; both stop after the current iteration and keep the best window.
+    signal.signal(signal.SIGINT, lambda *_: cancel_token.cancel())
+    signal.signal(signal.SIGTERM, lambda *_: cancel_token.cancel())
+
+    firefly_algorithm = opt.FireFly(
+        args.window_length, args.beta, args.freq_resolution, args.fireflies, args.iterations,
+        args.gamma, args.alpha, args.lamda, update_mode=args.update_mode,
+        response_engine=args.response_engine, engine=args.engine, polish=args.polish, warm_start=args.warm_start,
+        surrogate=args.surrogate, seed=args.seed, n_workers=args.workers,
+        stagnation_iter=args.stagnation_iter, target_pslr=args.target_pslr,
+        max_evaluations=args.max_evaluations, time_limit=args.time_limit,
+        min_freqResolution=args.min_freq_resolution, refine_peaks=args.refine_peaks,
+        interpolate_mw=args.interpolate_mw, precision=args.precision,
+        memory_budget=int(args.memory_budget * 2 ** 20), profile=args.profile,
+        checkpoint_path=args.checkpoint, checkpoint_interval=args.checkpoint_interval, resume=args.resume,
+        progress_callback=None if args.quiet else print_progress, cancel_token=cancel_token)
+
+    cache = None if args.no_cache else ResultCache(args.cache_dir)
+    if args.islands:
+        from islands import IslandModel
+
+        model = IslandModel(firefly_algorithm, args.islands, migration_interval=args.migration_interval)
+        entry, hit = run_cached(firefly_algorithm, cache, run=model.optimizer,
+                                warm_start_designs=args.warm_start_designs,
+                                islands=args.islands, migration_interval=args.migration_interval)
+    else:
+        entry, hit = run_cached(firefly_algorithm, cache, warm_start_designs=args.warm_start_designs)
+    if not args.quiet:
+        print("Loaded from cache." if hit else "", file=sys.stderr)
+
+    results = {"parameters": entry["params"], "report": entry["report"]}
+    if args.profile and not hit:
+        results["profile"] = firefly_algorithm.profile_report()
+        print(json.dumps(results["profile"]), file=sys.stderr)
+    for name, (mw, pslr, pl) in entry["metrics"].items():
+        results[name] = {"mw": mw, "pslr": pslr, "pl": pl}
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    np.savetxt(os.path.join(args.output_dir, "window.txt"), entry["window_optimized"])
+    with open(os.path.join(args.output_dir, "results.json"), "w") as file:
+        json.dump(results, file, indent=2)
+    print(json.dumps(dict(results["optimized"], **results["report"])))
+    if cancel_token.cancelled:
+        print("Process stopped by user; the best window so far was written.", file=sys.stderr)
+        return 130
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
@@ -0,0 +1,425 @@
+import abc
+import os
+
+import numpy as np
+
+# Inertia weight and acceleration coefficients of the particle swarm (constriction coefficients of Clerc and Kennedy)
+pso_inertia = 0.7298
+pso_cognitive = 1.49618
+pso_social = 1.49618
+# Largest velocity component of a particle, as a share of the [0, 1] search range
+pso_max_velocity = 0.2
+# Differential weight and crossover probability of differential evolution (DE/rand/1/bin)
+de_weight = 0.5
+de_crossover = 0.9
+# Initial step size of CMA-ES, on the [0, 1] scale of the window coefficients
+cmaes_sigma = 0.1
+
+
+class SearchEngine(abc.ABC):
+    """
+    Search loop over the objective of a FireFly (`FireFly.objective_batch`).
+
+    `run` is the loop of `FireFly.optimizer` for every engine: progress and
+    iteration callbacks, cancellation, stopping criteria
+    (`FireFly.check_stopping`), the multi-fidelity schedule, checkpoints, the
+    run report, the profiler and the `parallel.ParallelEvaluator`. Subclasses
+    implement `initialize`, `step` and, if they keep fitness values across
+    iterations, `rescore`; `state_attributes` names the attributes a
+    checkpoint has to keep besides the returned population and fitness.
+
+    Every engine starts from the population of `FireFly.initialize_fireflies`,
+    draws from `firefly.rng` and evaluates `firefly.n_pop` candidates per
+    iteration, so runs with the same seed are reproducible and the engines can
+    be compared evaluation for evaluation.
+    """
+
+    name = None
+    state_attributes = ()
+
+    def __init__(self, firefly):
+        self.firefly = firefly
+        self.evaluator = None
+
+    def evaluate(self, population):
+        """
+        Returns the objective function value of every row of `population`.
+        """
+        firefly = self.firefly
+        # The worker processes hold buffers for exactly n_pop candidates.
+        evaluator = self.evaluator if len(population) == firefly.n_pop else None
+        return firefly.evaluate(population.astype(firefly.dtype, copy=False), evaluator).astype(np.float64)
+
+    @abc.abstractmethod
+    def initialize(self):
+        """
+        Creates the engine state.
+
+        Returns:
+            The initial population and its fitness.
+        """
+
+    @abc.abstractmethod
+    def step(self, t):
+        """
+        Performs iteration `t`.
+
+        Returns:
+            The population whose best member is the best candidate so far, and
+            its fitness.
+        """
+
+    def rescore(self):
+        """
+        Re-evaluates the stored fitness values after the multi-fidelity
+        schedule moved to a finer frequency grid.
+        """
+
+    def state(self):
+        """
+        Returns the attributes of `state_attributes` for `FireFly.save_checkpoint`.
+        """
+        return {name: getattr(self, name) for name in self.state_attributes}
+
+    def load_state(self, population, fitness, arrays):
+        """
+        Restores the engine from a checkpoint: the population and fitness
+        returned by the last `step` and the arrays of `state`.
+        """
+        for name in self.state_attributes:
+            value = arrays[name]
+            setattr(self, name, value.item() if value.ndim == 0 else value)
+
+    def save_checkpoint(self, population, fitness, t):
+        """
+        Saves the state before iteration `t`, if the run has a `checkpoint_path`.
+        """
+        if self.firefly.checkpoint_path is not None:
+            self.firefly.save_checkpoint(population, fitness, t, self.state())
+
+    def run(self, evaluator=None):
+        """
+        Runs the engine for `firefly.max_iter` iterations or until a stopping
+        criterion fires, see `FireFly.optimizer`.
+
+        With `firefly.checkpoint_path` the state is saved every
+        `checkpoint_interval` iterations, when the run stops and when it is
+        cancelled; with `firefly.resume` the run continues from that
+        checkpoint if it exists (see `FireFly.load_checkpoint`).
+
+        Returns:
+            The standard Kaiser window and the optimized window.
+        """
+        firefly = self.firefly
+        self.evaluator = evaluator
+        firefly.start_run()
+        if firefly.resume and firefly.checkpoint_path is not None and os.path.exists(firefly.checkpoint_path):
+            population, fitness, start, arrays = firefly.load_checkpoint()
+            self.load_state(population, fitness, arrays)
+        else:
+            firefly.eval_resolution = firefly.fidelity_resolution(0)
+            population, fitness = self.initialize()
+            start = 0
+
+        for t in range(start, firefly.max_iter):
+            if firefly.is_cancelled():
+                firefly.stop_reason = "cancelled"
+                self.save_checkpoint(population, fitness, t)
+                break
+            resolution = firefly.fidelity_resolution(t)
+            if resolution != firefly.eval_resolution:
+                firefly.eval_resolution = resolution
+                self.rescore()
+            population, fitness = self.step(t)
+            firefly.n_iterations = t + 1
+            firefly.stop_reason = firefly.check_stopping(population, fitness)
+            firefly.report_iteration()
+            if firefly.stop_reason is not None or (t + 1) % firefly.checkpoint_interval == 0:
+                self.save_checkpoint(population, fitness, t + 1)
+            if firefly.stop_reason is not None:
+                firefly.report_progress(100)
+                break
+            firefly.report_progress(round(((t + 1) / firefly.max_iter) * 100, 2))
+        else:
+            firefly.stop_reason = "max_iter"
+
+        return firefly.finish_run(population, fitness)
+
+
+class FireflyAlgorithm(SearchEngine):
+    """
+    The Firefly Algorithm: `FireFly.iterate` in the asynchronous or
+    synchronous update mode, with the randomization parameter alpha decaying
+    after every iteration (`FireFly.new_alpha`). With `surrogate`, the screen
+    of the asynchronous mode restarts whenever the frequency grid changes.
+
+    The fitness values stay in the precision of the search loop.
+    """
+
+    name = "firefly"
+    state_attributes = ("alpha",)
+
+    def evaluate(self, population):
+        return self.firefly.evaluate(population, self.evaluator)
+
+    def initialize(self):
+        firefly = self.firefly
+        self.population = firefly.initialize_fireflies(firefly.window)
+        self.fitness = self.evaluate(self.population)
+        self.alpha = firefly.alpha
+        if firefly.screen is not None:
+            firefly.screen.reset(self.population, self.fitness)
+
+        return self.population, self.fitness
+
+    def step(self, t):
+        firefly = self.firefly
+        self.population, self.fitness = firefly.iterate(self.population, self.fitness, self.alpha, t, self.evaluator)
+        self.alpha = firefly.new_alpha(self.alpha)
+
+        return self.population, self.fitness
+
+    def rescore(self):
+        self.fitness = self.evaluate(self.population)
+        if self.firefly.screen is not None:
+            self.firefly.screen.reset(self.population, self.fitness)
+
+    def load_state(self, population, fitness, arrays):
+        super().load_state(population, fitness, arrays)
+        self.population, self.fitness = population, fitness
+
+
+class ParticleSwarm(SearchEngine):
+    """
+    Global-best particle swarm optimization with constriction coefficients.
+
+    Every particle is pulled towards its own best position and the best
+    position of the swarm; positions are clipped to [0, 1] like the fireflies.
+    """
+
+    name = "pso"
+    state_attributes = ("position", "velocity")
+
+    def initialize(self):
+        firefly = self.firefly
+        self.position = firefly.initialize_fireflies(firefly.window).astype(np.float64)
+        self.velocity = np.zeros_like(self.position)
+        self.best_position = self.position.copy()
+        self.best_fitness = self.evaluate(self.position)
+
+        return self.best_position, self.best_fitness
+
+    def step(self, t):
+        rng = self.firefly.rng
+        leader = self.best_position[np.argmax(self.best_fitness)]
+        r1, r2 = rng.random((2,) + self.position.shape)
+        self.velocity = (pso_inertia * self.velocity
+                         + pso_cognitive * r1 * (self.best_position - self.position)
+                         + pso_social * r2 * (leader - self.position))
+        np.clip(self.velocity, -pso_max_velocity, pso_max_velocity, out=self.velocity)
+        self.position = np.clip(self.position + self.velocity, 0, 1)
+
+        fitness = self.evaluate(self.position)
+        improved = fitness > self.best_fitness
+        self.best_position[improved] = self.position[improved]
+        self.best_fitness[improved] = fitness[improved]
+
+        return self.best_position, self.best_fitness
+
+    def rescore(self):
+        self.best_fitness = self.evaluate(self.best_position)
+
+    def load_state(self, population, fitness, arrays):
+        super().load_state(population, fitness, arrays)
+        self.best_position, self.best_fitness = population, fitness
+
+
+class DifferentialEvolution(SearchEngine):
+    """
+    Differential evolution, DE/rand/1/bin: every member competes with a trial
+    vector built from three other random members and keeps the better one.
+    """
+
+    name = "de"
+
+    def __init__(self, firefly):
+        if firefly.n_pop < 4:
+            raise ValueError(f"differential evolution needs at least 4 members, got n_pop={firefly.n_pop}")
+        super().__init__(firefly)
+
+    def initialize(self):
+        firefly = self.firefly
+        self.population = firefly.initialize_fireflies(firefly.window).astype(np.float64)
+        self.fitness = self.evaluate(self.population)
+
+        return self.population, self.fitness
+
+    def step(self, t):
+        rng = self.firefly.rng
+        n, dimension = self.population.shape
+        # Three distinct donors per member, all different from the member itself
+        donors = np.argsort(rng.random((n, n - 1)), axis=1)[:, :3]
+        donors += donors >= np.arange(n)[:, None]
+        a, b, c = (self.population[donors[:, k]] for k in range(3))
+        mutant = np.clip(a + de_weight * (b - c), 0, 1)
+
+        crossover = rng.random((n, dimension)) < de_crossover
+        crossover[np.arange(n), rng.integers(0, dimension, n)] = True
+        trial = np.where(crossover, mutant, self.population)
+
+        fitness = self.evaluate(trial)
+        improved = fitness >= self.fitness
+        self.population[improved] = trial[improved]
+        self.fitness[improved] = fitness[improved]
+
+        return self.population, self.fitness
+
+    def rescore(self):
+        self.fitness = self.evaluate(self.population)
+
+    def load_state(self, population, fitness, arrays):
+        self.population, self.fitness = population, fitness
+
+
+class CMAES(SearchEngine):
+    """
+    Covariance matrix adaptation evolution strategy with `n_pop` samples per
+    iteration, rank-one and rank-mu updates and cumulative step-size
+    adaptation (the default parameters of Hansen's tutorial).
+
+    The search starts at the Kaiser half window (or the first warm start
+    window, see `FireFly.warm_start_windows`) with step size `cmaes_sigma`.
+    Samples are clipped to [0, 1] before they are evaluated and used in the
+    update. The eigendecomposition of the covariance matrix is only renewed
+    every few iterations, so that long windows stay affordable.
+    """
+
+    name = "cmaes"
+    state_attributes = ("mean", "sigma", "C", "B", "D", "pc", "ps", "best", "best_fitness")
+
+    def configure(self):
+        """
+        Sets the strategy parameters, which depend only on L and `n_pop`.
+        """
+        n = self.firefly.L // 2
+        self.n_samples = self.firefly.n_pop
+        self.mu = max(1, self.n_samples // 2)
+        weights = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / np.sum(weights)
+        self.mueff = 1 / np.sum(self.weights ** 2)
+
+        self.cc = (4 + self.mueff / n) / (n + 4 + 2 * self.mueff / n)
+        self.cs = (self.mueff + 2) / (n + self.mueff + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + self.mueff)
+        self.cmu = min(1 - self.c1, 2 * (self.mueff - 2 + 1 / self.mueff) / ((n + 2) ** 2 + self.mueff))
+        self.damps = 1 + 2 * max(0, np.sqrt((self.mueff - 1) / (n + 1)) - 1) + self.cs
+        self.chi_n = np.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+        self.eigen_interval = max(1, int(1 / ((self.c1 + self.cmu) * n * 10)))
+
+    def initialize(self):
+        firefly = self.firefly
+        n = firefly.L // 2
+        self.configure()
+        seeds = firefly.warm_start_windows()
+        self.mean = np.array(seeds[0] if seeds else firefly.window[:n], dtype=np.float64)
+        self.sigma = cmaes_sigma
+        self.C = np.eye(n)
+        self.B = np.eye(n)
+        self.D = np.ones(n)
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+
+        # The initial population of the other engines only provides the starting best candidate.
+        population = firefly.initialize_fireflies(firefly.window).astype(np.float64)
+        fitness = self.evaluate(population)
+        best = np.argmax(fitness)
+        self.best, self.best_fitness = population[best].copy(), fitness[best]
+
+        return population, fitness
+
+    def step(self, t):
+        n = len(self.mean)
+        z = self.firefly.rng.standard_normal((self.n_samples, n))
+        samples = np.clip(self.mean + self.sigma * (z * self.D) @ self.B.T, 0, 1)
+        fitness = self.evaluate(samples)
+
+        selected = np.argsort(fitness)[::-1][:self.mu]
+        y = (samples[selected] - self.mean) / self.sigma
+        y_mean = self.weights @ y
+        self.mean = self.mean + self.sigma * y_mean
+
+        inverse_sqrt_C = (self.B / self.D) @ self.B.T
+        self.ps = (1 - self.cs) * self.ps + np.sqrt(self.cs * (2 - self.cs) * self.mueff) * inverse_sqrt_C @ y_mean
+        ps_norm = np.linalg.norm(self.ps)
+        hsig = ps_norm / np.sqrt(1 - (1 - self.cs) ** (2 * (t + 1))) / self.chi_n < 1.4 + 2 / (n + 1)
+        self.pc = (1 - self.cc) * self.pc + hsig * np.sqrt(self.cc * (2 - self.cc) * self.mueff) * y_mean
+
+        self.C = ((1 - self.c1 - self.cmu) * self.C
+                  + self.c1 * (np.outer(self.pc, self.pc) + (1 - hsig) * self.cc * (2 - self.cc) * self.C)
+                  + self.cmu * (y.T * self.weights) @ y)
+        self.sigma *= np.exp(self.cs / self.damps * (ps_norm / self.chi_n - 1))
+
+        if (t + 1) % self.eigen_interval == 0:
+            self.C = (self.C + self.C.T) / 2
+            eigenvalues, self.B = np.linalg.eigh(self.C)
+            self.D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+
+        # Keep the best candidate so far in the returned population, in place of the worst sample.
+        best = np.argmax(fitness)
+        if fitness[best] > self.best_fitness:
+            self.best, self.best_fitness = samples[best].copy(), fitness[best]
+        worst = np.argmin(fitness)
+        samples[worst], fitness[worst] = self.best, self.best_fitness
+
+        return samples, fitness
+
+    def rescore(self):
+        self.best_fitness = self.evaluate(self.best[None, :])[0]
+
+    def load_state(self, population, fitness, arrays):
+        self.configure()
+        super().load_state(population, fitness, arrays)
+
+
+class DirectDesign(SearchEngine):
+    """
+    Minimax design by linear programming (`FireFly.direct_design`) instead of
+    a stochastic search: one "iteration", no population and no checkpoints.
+    """
+
+    name = "direct"
+
+    def initialize(self):
+        firefly = self.firefly
+        firefly.eval_resolution = firefly.freqResolution
+        self.population = firefly.direct_design()[None, :]
+        self.fitness = firefly.objective_batch(self.population)
+
+        return self.population, self.fitness
+
+    def step(self, t):
+        return self.population, self.fitness
+
+    def run(self, evaluator=None):
+        firefly = self.firefly
+        firefly.start_run()
+        population, fitness = self.initialize()
+        firefly.n_iterations = 1
+        firefly.stop_reason = "direct"
+        firefly.check_stopping(population, fitness)
+        firefly.report_iteration()
+        firefly.report_progress(100)
+
+        return firefly.finish_run(population, fitness)
+
+
+# Engines by `FireFly.engine` name
+engine_classes = {engine.name: engine
+                  for engine in (FireflyAlgorithm, ParticleSwarm, DifferentialEvolution, CMAES, DirectDesign)}
+
+
+def make_engine(firefly):
+    """
+    Returns the SearchEngine selected by `firefly.engine`.
+    """
+    return engine_classes[firefly.engine](firefly)
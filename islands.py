@@ -0,0 +1,189 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import optimizer as opt
+
+
+def _initialize_island(params):
+    """
+    Creates the initial population of one island and evaluates it.
+    """
+    firefly = opt.FireFly(**params)
+    population = firefly.initialize_fireflies(firefly.window)
+    firefly.eval_resolution = firefly.fidelity_resolution(0)
+    fitness = firefly.objective_batch(population)
+
+    return population, fitness, firefly.alpha, firefly.rng.bit_generator.state
+
+
+def _run_island(params, population, fitness, alpha, rng_state, start, n_iter, max_evaluations, time_limit):
+    """
+    Runs iterations `start` to `start + n_iter` of one island, or fewer once
+    it used up `max_evaluations` objective evaluations or `time_limit` seconds
+    (its share of the remaining budget of the island model, None for no limit).
+
+    Returns:
+        The island state (population, fitness, alpha, RNG state) after the
+        iterations, the best fitness after each of them, the PSLR and mainlobe
+        width of the brightest firefly after each of them (see
+        `FireFly.best_metrics`), the index of that firefly after the last one
+        and the number of objective evaluations.
+    """
+    firefly = opt.FireFly(**dict(params, max_evaluations=max_evaluations, time_limit=time_limit))
+    firefly.start_time = time.perf_counter()
+    firefly.rng.bit_generator.state = rng_state
+    firefly.eval_resolution = firefly.fidelity_resolution(max(start - 1, 0))
+    history = []
+    metrics = []
+    for t in range(start, start + n_iter):
+        population, fitness = firefly.iterate(population, fitness, alpha, t)
+        alpha = firefly.new_alpha(alpha)
+        history.append(np.max(fitness))
+        best, pslr, mw = firefly.best_metrics(population, fitness)
+        metrics.append((pslr, mw))
+        if firefly.budget_exhausted() is not None:
+            break
+
+    return (population, fitness, alpha, firefly.rng.bit_generator.state, history, metrics, best,
+            firefly.n_evaluations)
+
+
+class IslandModel:
+    """
+    Island-model Firefly Algorithm: `n_islands` independent swarms, each built
+    with `FireFly.initialize_fireflies` and moved with `FireFly.iterate`, run in
+    parallel processes. Every `migration_interval` iterations the `n_migrants`
+    best fireflies of each island replace the worst ones of the next island
+    (ring topology).
+
+    The islands are configured like `firefly` (its `get_params`), with their
+    own seeds derived from `firefly.seed`, and report progress and check for
+    cancellation through `firefly`. The stopping criteria of `firefly` (see
+    `FireFly.check_stopping`) apply to all islands together: every island
+    gets an equal share of the remaining evaluation and time budget for each
+    migration round, and after the round the criteria are checked for every
+    iteration on the best PSLR over all islands.
+    """
+
+    def __init__(self, firefly, n_islands, migration_interval=10, n_migrants=1, n_workers=None):
+        if firefly.surrogate:
+            raise ValueError("the island model does not support the surrogate screen")
+        self.firefly = firefly
+        self.n_islands = n_islands
+        self.migration_interval = migration_interval
+        self.n_migrants = n_migrants
+        self.n_workers = min(n_islands, n_workers or os.cpu_count() or 1)
+
+        seeds = np.random.SeedSequence(firefly.seed).generate_state(n_islands)
+        self.island_params = [dict(firefly.get_params(), seed=int(seed), n_workers=1) for seed in seeds]
+
+    def budget_share(self):
+        """
+        Returns the objective evaluations and seconds every island may use in
+        the next migration round (None where `firefly` sets no limit).
+        """
+        firefly = self.firefly
+        max_evaluations = time_limit = None
+        if firefly.max_evaluations is not None:
+            max_evaluations = max(1, -(-(firefly.max_evaluations - firefly.n_evaluations) // self.n_islands))
+        if firefly.time_limit is not None:
+            time_limit = firefly.time_limit - (time.perf_counter() - firefly.start_time)
+        return max_evaluations, time_limit
+
+    def migrate(self, islands):
+        """
+        Copies the best fireflies of every island over the worst ones of the next.
+        """
+        migrants = []
+        for population, fitness, *_ in islands:
+            best = np.argsort(fitness)[-self.n_migrants:]
+            migrants.append((population[best].copy(), fitness[best].copy()))
+
+        for k, (population, fitness, *_) in enumerate(islands):
+            incoming, incoming_fitness = migrants[k - 1]
+            worst = np.argsort(fitness)[:self.n_migrants]
+            population[worst] = incoming
+            fitness[worst] = incoming_fitness
+
+    def optimizer(self):
+        """
+        Runs all islands for `firefly.max_iter` iterations.
+
+        After the run, `history` holds the best fitness of every island after
+        every iteration (shape `(n_islands, iterations)`, an island that ran
+        out of budget early repeats its last value), `best_island` the island
+        that found the global best and `best_fitness` its fitness.
+        `firefly.history` holds the best PSLR over all islands after every
+        iteration, and `iteration_callback` of `firefly` is called after every
+        migration round. The run report of `firefly` (`FireFly.run_report`)
+        covers all islands; its profile (`FireFly.profile_report`) only sees
+        the time spent waiting for them, as "workers".
+
+        Returns:
+            The standard Kaiser window and the global best optimized window,
+            like `FireFly.optimizer` (the best one so far when cancelled).
+        """
+        firefly = self.firefly
+        firefly.start_run()
+        # Every island starts from the warm start windows of `firefly` (see `FireFly.warm_start_windows`),
+        # computed once here, so that the islands do not solve the same `FireFly.direct_design` again.
+        seed_windows = [firefly.symmetric_window(window) for window in firefly.warm_start_windows()]
+        firefly.n_evaluations += self.n_islands * firefly.n_pop
+
+        with ProcessPoolExecutor(max_workers=self.n_workers) as pool:
+            initial_params = [dict(params, warm_start=False, seed_windows=seed_windows) for params in self.island_params]
+            islands = [list(state) for state in pool.map(_initialize_island, initial_params)]
+            histories = [[] for _ in islands]
+
+            t = 0
+            while t < firefly.max_iter:
+                if firefly.is_cancelled():
+                    firefly.stop_reason = "cancelled"
+                    break
+                n_iter = min(self.migration_interval, firefly.max_iter - t)
+                futures = [pool.submit(_run_island, params, *island, t, n_iter, *self.budget_share())
+                           for params, island in zip(self.island_params, islands)]
+                metrics, best = [], []
+                for k, future in enumerate(futures):
+                    with firefly.phase("workers"):
+                        *islands[k], history, island_metrics, island_best, n_evaluations = future.result()
+                    histories[k].extend(history)
+                    metrics.append(island_metrics)
+                    best.append(island_best)
+                    firefly.n_evaluations += n_evaluations
+
+                n_done = max(len(island_metrics) for island_metrics in metrics)
+                for s in range(n_done):
+                    pslr, mw = min((island_metrics[min(s, len(island_metrics) - 1)] for island_metrics in metrics),
+                                   key=lambda pair: pair[0])
+                    firefly.history.append(pslr)
+                    firefly.stop_reason = firefly.stop_reason or firefly.stopping_reason(pslr, mw)
+                t += n_done
+                firefly.n_iterations = t
+                leader = int(np.argmin([island_metrics[-1][0] for island_metrics in metrics]))
+                firefly.best_window = islands[leader][0][best[leader]]
+                firefly.report_iteration()
+                if firefly.stop_reason is not None:
+                    firefly.report_progress(100)
+                    break
+                if t < firefly.max_iter:
+                    self.migrate(islands)
+                firefly.report_progress(round((t / firefly.max_iter) * 100, 2))
+
+        if firefly.stop_reason is None:
+            firefly.stop_reason = "max_iter"
+        n_iterations = max(len(history) for history in histories)
+        self.history = np.array([history + history[-1:] * (n_iterations - len(history)) for history in histories])
+        population = np.concatenate([island[0] for island in islands])
+        fitness = np.concatenate([island[1] for island in islands])
+        firefly.eval_resolution = firefly.fidelity_resolution(max(firefly.n_iterations - 1, 0))
+        best = firefly.select_best(population, fitness)
+        self.best_island = best // firefly.n_pop
+        self.best_fitness = fitness[best]
+        try:
+            return firefly.finish_run(population, fitness, best)
+        finally:
+            firefly.finish_profile()
@@ -1,5 +1,5 @@
-from PyQt6.QtWidgets import QApplication, QMainWindow, QFileDialog, QMessageBox, QVBoxLayout, QDialog,  QLabel, QPushButton
-from PyQt6.QtCore import QThread, pyqtSignal, Qt 
+from PyQt6.QtWidgets import QApplication, QMainWindow, QFileDialog, QMessageBox, QVBoxLayout, QDialog,  QLabel, QPushButton, QCheckBox, QWidget
+from PyQt6.QtCore import QThread, QTimer, pyqtSignal, Qt 
 from PyQt6.QtGui import QIcon
 from PyQt6 import QtGui
 from ui import Ui_MainWindow
@@ -7,8 +7,15 @@ from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 import numpy as np
 import optimizer as opt
+from cache import ResultCache, run_cached
 import sys
 import os
+import time
+
+# Shortest time (s) between two live plot updates sent by the worker thread
+live_update_interval = 0.1
+# Period (ms) at which the GUI redraws the live plots with the latest update
+live_render_interval_ms = 100
 
 class DescriptionAboutUs(QDialog):
     def __init__(self):
@@ -138,15 +145,94 @@ class MplCanvas(FigureCanvas):
         super().__init__(self.fig)
 
 
+class LiveCanvas(MplCanvas):
+    """
+    Canvas whose lines are updated while the optimization runs.
+
+    Lines added with `add_line` are created once, changed with `set_line`
+    (`Line2D.set_data`) and drawn by `refresh` on top of a cached copy of the
+    static background (blitting). The whole figure is only redrawn when a line
+    leaves the axis limits.
+    """
+
+    def __init__(self, parent=None, width=5, height=4, dpi=100):
+        super().__init__(parent, width, height, dpi)
+        self.lines = {}
+        self.background = None
+        self.mpl_connect("draw_event", self.on_draw)
+
+    def start(self, xlabel, ylabel, xlim=None, ylim=None):
+        self.fig.clf()
+        self.ax = self.fig.add_subplot(111)
+        self.ax.set_xlabel(xlabel)
+        self.ax.set_ylabel(ylabel)
+        self.ax.grid(True)
+        if xlim is not None:
+            self.ax.set_xlim(*xlim)
+        if ylim is not None:
+            self.ax.set_ylim(*ylim)
+        self.fig.subplots_adjust(left=0.15, right=0.95, top=0.95, bottom=0.1)
+        self.lines = {}
+        self.background = None
+
+    def clear(self):
+        self.fig.clf()
+        self.lines = {}
+        self.background = None
+        self.draw()
+
+    def add_line(self, name, **kwargs):
+        line, = self.ax.plot([], [], animated=True, **kwargs)
+        self.lines[name] = line
+
+    def set_line(self, name, x, y):
+        if name in self.lines:
+            self.lines[name].set_data(x, y)
+
+    def on_draw(self, event):
+        # Lines of a figure cleared by `plot_tab1`/`plot_tab2` are gone.
+        self.lines = {name: line for name, line in self.lines.items() if line.axes in self.fig.axes}
+        self.background = self.copy_from_bbox(self.fig.bbox)
+        self.draw_lines()
+
+    def draw_lines(self):
+        for line in self.lines.values():
+            self.ax.draw_artist(line)
+
+    def lines_inside(self):
+        x0, x1 = sorted(self.ax.get_xlim())
+        y0, y1 = sorted(self.ax.get_ylim())
+        for line in self.lines.values():
+            x, y = line.get_data()
+            if len(x) and (np.min(x) < x0 or np.max(x) > x1 or np.min(y) < y0 or np.max(y) > y1):
+                return False
+        return True
+
+    def refresh(self):
+        if not self.lines:
+            return
+        if self.background is None or not self.lines_inside():
+            self.ax.relim()
+            self.ax.autoscale_view()
+            self.draw()
+            return
+        self.restore_region(self.background)
+        self.draw_lines()
+        self.blit(self.fig.bbox)
+
+
 class WorkerThread(QThread):
 
         progress = pyqtSignal(float)
         finished = pyqtSignal(str)
         set_input = pyqtSignal(float, float, float, float, float, float, object, int)
         plot_window = pyqtSignal(object, object, object)
+        profile = pyqtSignal(str)
+        live_start = pyqtSignal(object, object, object)
+        live_update = pyqtSignal(object, object, object, object)
 
 
-        def __init__(self, window_lenght, beta, freqResolution, num_firefly, iteration, gamma, alpha, lamda):
+        def __init__(self, window_lenght, beta, freqResolution, num_firefly, iteration, gamma, alpha, lamda, cache=None, profile=False):
                 super().__init__()
                 self.window_lenght = window_lenght
                 self.beta = beta
@@ -156,22 +242,50 @@ class WorkerThread(QThread):
                 self.gamma = gamma
                 self.alpha = alpha
                 self.lamda = lamda
-                self._is_running = True
+                self.cancel_token = opt.CancellationToken()
+                self.cache = cache
+                self.profiling = profile
+                self.firefly_algorithm = None
+                self.last_live_update = 0.0
                             
         def run(self): 
-                firefly_algorithm = opt.FireFly(self, self.window_lenght, self.beta, self.freqResolution, self.num_firefly, self.iteration, self.gamma, self.alpha, self.lamda)
-                window, window_optimized = firefly_algorithm.optimizer()
-                if self._is_running:
-                        mw, pslr, pl= firefly_algorithm.calculate_MW_PSLR_PL(window)
-                        mw_optimized, pslr_optimized, pl_optimized = firefly_algorithm.calculate_MW_PSLR_PL(window_optimized)
-                        self.set_input.emit(mw_optimized, pslr_optimized, pl_optimized, mw, pslr, pl, window_optimized, self.window_lenght)
-                        self.plot_window.emit(firefly_algorithm, window, window_optimized)
+                firefly_algorithm = opt.FireFly(self.window_lenght, self.beta, self.freqResolution, self.num_firefly, self.iteration, self.gamma, self.alpha, self.lamda,
+                                                progress_callback=self.report_progress, cancel_token=self.cancel_token, profile=self.profiling,
+                                                iteration_callback=self.report_iteration)
+                self.firefly_algorithm = firefly_algorithm
+                freq, H = firefly_algorithm.calculate_H(firefly_algorithm.window)
+                self.live_start.emit(firefly_algorithm.window, freq, H)
+                entry, hit = run_cached(firefly_algorithm, self.cache)
+                if self.profiling:
+                        stats = firefly_algorithm.profile_report()
+                        self.profile.emit("Loaded from cache." if hit else opt.format_profile(stats))
+                window, window_optimized = entry["window"], entry["window_optimized"]
+                # A stopped run still returns the best window found so far.
+                mw, pslr, pl = entry["metrics"]["kaiser"]
+                mw_optimized, pslr_optimized, pl_optimized = entry["metrics"]["optimized"]
+                self.set_input.emit(mw_optimized, pslr_optimized, pl_optimized, mw, pslr, pl, window_optimized, self.window_lenght)
+                self.plot_window.emit(firefly_algorithm, window, window_optimized)
+                if not self.cancel_token.cancelled:
                         self.finished.emit("Processing completed.")
                 else:
-                        self.finished.emit("Process stopped by user.")
+                        self.finished.emit("Process stopped by user; showing the best window so far.")
           
+        def report_progress(self, value):
+                self.progress.emit(value)
+                if self.profiling:
+                        self.profile.emit(opt.format_profile(self.firefly_algorithm.profile_report()))
+
+        def report_iteration(self, iteration, history, window):
+                # Throttled, so that the GUI thread is not flooded with updates; the last iteration is always sent.
+                now = time.perf_counter()
+                if now - self.last_live_update < live_update_interval and iteration < self.iteration:
+                        return
+                self.last_live_update = now
+                freq, H = self.firefly_algorithm.calculate_H(window)
+                self.live_update.emit(np.array(history), window, freq, H)
+
         def stop(self):
-                self._is_running = False
+                self.cancel_token.cancel()
 
               
 
@@ -181,6 +295,7 @@ class MyWindow(QMainWindow):
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
         self.setFixedSize(self.size())
+        self.cache = ResultCache()
 
         doubleValidatorAlpha = QtGui.QDoubleValidator(0.0, 1, 2)
         doubleValidatorAlpha.setNotation(QtGui.QDoubleValidator.Notation.StandardNotation)
@@ -220,12 +335,37 @@ class MyWindow(QMainWindow):
         self.ui.textEdit_pl_original.setReadOnly(True)
         self.ui.textEdit_final_window.setReadOnly(True)
 
+        # Live profiler readout next to the progress text, shown while "Profile" is checked
+        self.ui.label_profile = QLabel(parent=self.ui.centralwidget)
+        self.ui.label_profile.setGeometry(396, 560, 395, 31)
+        self.ui.label_profile.setStyleSheet("QLabel {\n"
+"    background-color: #F0F0F0;\n"
+"    color: #333;\n"
+"    font-size: 8pt;\n"
+"    padding-left: 6px;\n"
+"}")
+        self.ui.label_profile.hide()
+        self.ui.checkBox_profile = QCheckBox("Profile")
+        self.ui.checkBox_profile.setToolTip("Show where the optimization spends its time")
+        self.ui.statusbar.addPermanentWidget(self.ui.checkBox_profile)
+
         self.ui.tab_time_domain_box = QVBoxLayout(self.ui.tab_time_domain)
         self.ui.tab_frequancy_response_box = QVBoxLayout(self.ui.tab_frequancy_response)
-        self.ui.canvas_time_domain = MplCanvas()
+        self.ui.canvas_time_domain = LiveCanvas()
         self.ui.tab_time_domain_box.addWidget(self.ui.canvas_time_domain)
-        self.ui.canvas_frequancy_response = MplCanvas()
+        self.ui.canvas_frequancy_response = LiveCanvas()
         self.ui.tab_frequancy_response_box.addWidget(self.ui.canvas_frequancy_response)
+        self.ui.tab_convergence = QWidget()
+        self.ui.tabWidget_Plots.addTab(self.ui.tab_convergence, "Convergence")
+        self.ui.tab_convergence_box = QVBoxLayout(self.ui.tab_convergence)
+        self.ui.canvas_convergence = LiveCanvas()
+        self.ui.tab_convergence_box.addWidget(self.ui.canvas_convergence)
+
+        # The worker only queues live updates; this timer draws the latest one.
+        self.live_data = None
+        self.live_timer = QTimer(self)
+        self.live_timer.setInterval(live_render_interval_ms)
+        self.live_timer.timeout.connect(self.render_live_plots)
 
         self.ui.textEdit_window_length.editingFinished.connect(self.check_even_or_odd)
         self.ui.exportButton.clicked.connect(self.export_func)
@@ -309,6 +449,9 @@ class MyWindow(QMainWindow):
         if freqResolution == 0:
                 error_count +=1
                 error_text = error_text + str(error_count) + "- " + "freqResolution can not be ziro. "
+        elif freqResolution < opt.min_points_per_sample * window_lenght:
+                error_count +=1
+                error_text = error_text + str(error_count) + "- " + f"freqResolution must be at least {opt.min_points_per_sample} * window_lenght. "
 
         if error_count != 0:
                 error_text = str(error_count) + " Error found: " + error_text
@@ -319,6 +462,8 @@ class MyWindow(QMainWindow):
 
     def plot_window(self, firefly_algorithm, window_standard, window_optimized):
 
+        self.stop_live_plots()
+
         self.plot_tab1(firefly_algorithm, window_standard, window_optimized, self.ui.canvas_time_domain)
 
         self.plot_tab2(firefly_algorithm, window_standard, window_optimized,  self.ui.canvas_frequancy_response)
@@ -373,8 +518,6 @@ class MyWindow(QMainWindow):
 
     def reset_func(self):
 
-        self.ui.canvas_time_domain.figure.clf()
-        self.ui.canvas_frequancy_response.figure.clf()
         self.ui.textEdit_Alpha.setText("0.1")
         self.ui.textEdit_Iteration.setText("100")
         self.ui.textEdit_Gamma.setText("0.15")
@@ -383,8 +526,8 @@ class MyWindow(QMainWindow):
         self.ui.textEdit_freqResolution.setText("1024")
         self.ui.textEdit_lambda.setText("10")
         self.set_input(0, 0, 0, 0, 0, 0, 0, 0)
-        self.ui.canvas_time_domain.draw()
-        self.ui.canvas_frequancy_response.draw()
+        for canvas in (self.ui.canvas_time_domain, self.ui.canvas_frequancy_response, self.ui.canvas_convergence):
+            canvas.clear()
 
     def kaiser_optimizer(self):
 
@@ -403,8 +546,13 @@ class MyWindow(QMainWindow):
 
         if self.check_input(window_lenght, beta, freqResolution, num_firefly, iteration, gamma, alpha):
                 
-            self.thread = WorkerThread(window_lenght, beta, freqResolution, num_firefly, iteration, gamma, alpha, lamda)
+            profile = self.ui.checkBox_profile.isChecked()
+            self.show_profile_label(profile)
+            self.thread = WorkerThread(window_lenght, beta, freqResolution, num_firefly, iteration, gamma, alpha, lamda, self.cache, profile)
             self.thread.progress.connect(self.update_progress)
+            self.thread.profile.connect(self.ui.label_profile.setText)
+            self.thread.live_start.connect(self.start_live_plots)
+            self.thread.live_update.connect(self.store_live_update)
             self.thread.finished.connect(self.task_finished)
             self.thread.set_input.connect(self.set_input)
             self.thread.plot_window.connect(self.plot_window)
@@ -413,11 +561,62 @@ class MyWindow(QMainWindow):
     def update_progress(self, value):
         self.ui.label_Error_2.setText(f"Processing: {value}%")
 
+    def start_live_plots(self, window_standard, freq, H_window_standard):
+
+        beta = self.thread.beta
+        canvas = self.ui.canvas_time_domain
+        canvas.start("Sample index", "Amplitude", xlim=(0, len(window_standard) - 1), ylim=(0, 1.05))
+        canvas.ax.plot(window_standard, label=f"Kaiser Window (β = {beta})", color="blue")
+        canvas.add_line("optimized", label="Optimized Window ", color="red")
+        canvas.ax.legend()
+        canvas.draw()
+
+        canvas = self.ui.canvas_frequancy_response
+        canvas.start("Sample index", "Magnitude [dB]", xlim=(freq[0], freq[-1]), ylim=(-62, 2))
+        canvas.ax.plot(freq, H_window_standard, label=f"Kaiser Window (β = {beta})", color="blue")
+        canvas.add_line("optimized", label="Optimized Window ", color="red")
+        canvas.ax.legend()
+        canvas.draw()
+
+        canvas = self.ui.canvas_convergence
+        canvas.start("Iteration", "Best PSLR [dB]", xlim=(1, max(2, self.thread.iteration)))
+        canvas.ax.set_autoscalex_on(False)
+        canvas.add_line("pslr", color="red")
+        canvas.draw()
+
+        self.live_data = None
+        self.live_timer.start()
+
+    def store_live_update(self, history, window_optimized, freq, H_window_optimized):
+        self.live_data = (history, window_optimized, freq, H_window_optimized)
+
+    def stop_live_plots(self):
+        self.live_timer.stop()
+        self.live_data = None
+
+    def render_live_plots(self):
+        if self.live_data is None:
+            return
+        history, window_optimized, freq, H_window_optimized = self.live_data
+        self.live_data = None
+
+        self.ui.canvas_time_domain.set_line("optimized", np.arange(len(window_optimized)), window_optimized)
+        self.ui.canvas_frequancy_response.set_line("optimized", freq, H_window_optimized)
+        self.ui.canvas_convergence.set_line("pslr", np.arange(1, len(history) + 1), history)
+        for canvas in (self.ui.canvas_time_domain, self.ui.canvas_frequancy_response, self.ui.canvas_convergence):
+            canvas.refresh()
+
+    def show_profile_label(self, visible):
+        self.ui.label_Error_2.setGeometry(0, 560, 395 if visible else 791, 31)
+        self.ui.label_profile.setText("")
+        self.ui.label_profile.setVisible(visible)
+
     def stop(self):
         self.thread.stop()
         
 
     def task_finished(self, msg):
+        self.stop_live_plots()
         self.ui.label_Error_2.setText(msg)
         self.ui.stopButton.hide()
         self.ui.optimizeButton.setEnabled(True)
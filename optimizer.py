@@ -1,13 +1,296 @@
 
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache, wraps
+
 import numpy as np
-from scipy.signal import find_peaks, freqz
+from scipy.optimize import linprog, minimize
+from scipy.signal import ZoomFFT, find_peaks, freqz
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 # Define constants for the optimization process
 threshold_dB = -3
+update_modes = ("async", "sync")
+response_engines = ("fft", "cosine", "zoom")
+# Search strategies over the FireFly objective, implemented in `engines`
+search_engines = ("firefly", "pso", "de", "cmaes", "direct")
+# Floating-point types of the search loop; results are always reported in float64
+precisions = ("float64", "float32")
+# Smallest frequency grid, in points per window sample, on which the mainlobe of the rectangular window spans several points
+min_points_per_sample = 4
+# Fireflies per independent random stream of the synchronous update
+rng_block_size = 16
+# Share of the population re-verified at full resolution when picking the best firefly on a coarse grid
+elite_fraction = 0.1
+# Highest sidelobe peaks per window refined between grid points, see `FireFly.refine_peak_levels`
+refine_top_peaks = 4
+# Rectangular-window lobes (of width 2/L in units of pi rad/sample) covered by the dense band of the zoom engine
+zoom_lobes = 6
+# Points per window sample of the coarse grid of the zoom engine beyond the dense band
+zoom_oversampling = 4
+# Default limit (bytes) of the temporary arrays of `FireFly.objective_batch` and `FireFly.move_fireflies`
+default_memory_budget = 256 * 2 ** 20
+# Temporary bytes per firefly and frequency point of `FireFly.objective_batch` (FFT, dB response, peak masks)
+response_bytes_per_point = 32
+# Temporary bytes per pair of fireflies of `FireFly.move_fireflies` (distances, attractions, masks)
+move_bytes_per_pair = 32
+# Bytes per frequency point and window coefficient of a `cosine_basis` block while it is built
+cosine_bytes_per_coefficient = 24
+# Largest total size (bytes) of the blocks kept by `cosine_basis`, further limited by `FireFly.memory_budget`
+cosine_cache_bytes = 64 * 2 ** 20
+# Smallest decrease of the best PSLR (in dB) that counts as progress for the stagnation criterion
+stagnation_tolerance_dB = 1e-3
+# Frequency points per window sample of the sidelobe surrogate of `FireFly.polish_window`
+polish_oversampling = 16
+# Sharpness (1/dB) of the soft maximum over the sidelobe levels in the successive polishing stages
+polish_sharpness = (1.0, 4.0, 16.0)
+# SLSQP iterations per polishing stage
+polish_max_iter = 200
+# Stopband edges tried by `FireFly.direct_design`, between the -3 dB crossing and 1.5 times the first null of the Kaiser window
+direct_edges = 12
+# Stopband frequencies per window sample in the first linear program of `FireFly.minimax_window`
+direct_initial_points = 2
+# Largest number of constraint exchanges of `FireFly.minimax_window`
+direct_max_rounds = 30
+# Largest share of the initial population replaced by warm start windows, see `FireFly.warm_start_windows`
+warm_start_fraction = 0.2
+# FireFly arguments that may differ between a checkpoint and the run resuming it
+resumable_params = ("n_workers", "memory_budget", "stagnation_iter", "target_pslr", "max_evaluations", "time_limit")
+# Context of `FireFly.phase` when profiling is disabled
+_no_phase = nullcontext()
+# Blocks of `cosine_basis`, least recently used first
+_cosine_cache = OrderedDict()
+
+
+class CancellationToken:
+    """
+    Flag shared between a running optimization and whoever controls it (the
+    GUI's Stop button, a signal handler of the CLI) to stop it early.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class PhaseProfiler:
+    """
+    Accumulates the wall-clock time and the number of calls of the phases of
+    an optimization: "response" (freqz and the batched spectra), "peaks"
+    (sidelobe peak search), "mainlobe" (mainlobe width), "move" (distance,
+    attraction and position updates), "workers" (waiting for the processes of
+    `parallel.ParallelEvaluator`), "emit" (progress callbacks, i.e. the GUI
+    signals), "polish" (`FireFly.polish_window`), "direct"
+    (`FireFly.direct_design`) and "surrogate" (`surrogate.SurrogateScreen`).
+    Time outside these phases is reported as "other". The time of a phase does
+    not include the phases started inside it.
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.seconds = {}
+        self.calls = {}
+        # Time spent in nested phases, one entry per active phase
+        self._nested = []
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.seconds[name] = self.seconds.get(name, 0.0) + elapsed - self._nested.pop()
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if self._nested:
+                self._nested[-1] += elapsed
+
+    def stats(self, n_evaluations):
+        """
+        Returns the time, call count and share of the run time of every phase,
+        the objective evaluations per second and the peak memory of the process
+        in MiB (None where the `resource` module is missing).
+        """
+        elapsed = time.perf_counter() - self.start_time
+        phases = {name: {"seconds": round(seconds, 6), "calls": self.calls[name],
+                         "share": round(seconds / elapsed, 4) if elapsed else 0.0}
+                  for name, seconds in self.seconds.items()}
+        other = elapsed - sum(self.seconds.values())
+        phases["other"] = {"seconds": round(other, 6), "calls": 0, "share": round(other / elapsed, 4) if elapsed else 0.0}
+
+        return {"seconds": round(elapsed, 6), "evaluations": n_evaluations,
+                "evaluations_per_second": round(n_evaluations / elapsed, 1) if elapsed else 0.0,
+                "peak_memory_mib": peak_memory_mib(), "phases": phases}
+
+
+
+def format_profile(stats):
+    """
+    Returns `PhaseProfiler.stats` as one line of text for a status label: the
+    phases taking at least 5% of the time, the evaluation rate and the peak memory.
+    """
+    shares = sorted(stats["phases"].items(), key=lambda item: -item[1]["share"])
+    text = " ".join(f"{name} {phase['share']:.0%}" for name, phase in shares if phase["share"] >= 0.05)
+    text += f" | {stats['evaluations_per_second']:.0f} eval/s"
+    if stats["peak_memory_mib"] is not None:
+        text += f" | {stats['peak_memory_mib']:.0f} MiB"
+    return text
+
+
+def peak_memory_mib():
+    """
+    Returns the peak resident memory of this process in MiB, or None where
+    the `resource` module is not available.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+    return round(peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10, 1)
+
+
+def profiled(name):
+    """
+    Decorator recording the calls of a FireFly method as phase `name` of its
+    profiler; without a profiler it costs one attribute lookup.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.profiler is None:
+                return method(self, *args, **kwargs)
+            with self.profiler.phase(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def cosine_basis(L, freqResolution, dtype=np.float64, start=0, stop=None, cache_bytes=cosine_cache_bytes):
+    """
+    Returns the cosine basis of the amplitude response of a symmetric window.
+
+    The frequency response of a symmetric window of even length `L` is
+    exp(-jw(L-1)/2) * A(w), where A(w) = sum_k 2 h[k] cos(w((L-1)/2 - k)) is real
+    and h is the first half of the window. Row f of the basis holds the cosine
+    terms at w = pi * f / freqResolution, the `freqz` grid, so that
+    A = h @ basis.T. Only the rows `start` to `stop` (by default all) are built.
+
+    The blocks are cached per arguments, up to `cache_bytes` in total.
+    A new block replaces the least recently used blocks of other grids; when
+    the blocks of its own grid fill the cache it is not cached, so that
+    sweeping over the blocks of a grid too large for the cache still hits on
+    the cached part instead of evicting each block before its next use.
+
+    Returns:
+        Read-only matrix of shape `(stop - start, L/2)`.
+    """
+    stop = freqResolution if stop is None else stop
+    key = (L, freqResolution, np.dtype(dtype), start, stop)
+    basis = _cosine_cache.get(key)
+    if basis is not None:
+        _cosine_cache.move_to_end(key)
+        return basis
+
+    w = np.pi * np.arange(start, stop) / freqResolution
+    basis = (2 * np.cos(np.outer(w, (L - 1) / 2 - np.arange(L // 2)))).astype(dtype)
+    basis.setflags(write=False)
+    free = cache_bytes - sum(block.nbytes for block in _cosine_cache.values())
+    for other in [other for other in _cosine_cache if other[:3] != key[:3]]:
+        if free >= basis.nbytes:
+            break
+        free += _cosine_cache.pop(other).nbytes
+    if free >= basis.nbytes:
+        _cosine_cache[key] = basis
+
+    return basis
+
+
+def resample_window(window, L):
+    """
+    Resamples a symmetric window of any length to length `L` by linear
+    interpolation over the normalized sample positions.
+
+    Returns:
+        The first half (L/2 samples) of the resampled window, scaled to a
+        maximum of 1.
+    """
+    window = np.asarray(window, dtype=np.float64)
+    positions = (np.arange(len(window)) + 0.5) / len(window)
+    half = np.interp((np.arange(L // 2) + 0.5) / L, positions, window)
+
+    return half / np.max(half)
+
+
+@lru_cache(maxsize=16)
+def zoom_transform(L, freqResolution):
+    """
+    Returns the transforms of the "zoom" response engine.
+
+    The band holding the mainlobe and the first `zoom_lobes` sidelobes is
+    evaluated with a chirp-Z (zoom) transform on the points of the `freqz` grid
+    of `freqResolution` points, the rest of the spectrum with an FFT of
+    `zoom_oversampling * L` points. Cached per `(L, freqResolution)`.
+
+    Returns:
+        transform: The ZoomFFT of the dense band.
+        n_coarse: Number of points of the coarse grid over [0, pi).
+        first_coarse: Index of the first coarse point beyond the dense band.
+        frequencies: Read-only angular frequencies of the combined grid.
+    """
+    n_coarse = zoom_oversampling * L
+    n_dense = min(freqResolution, int(np.ceil(freqResolution * zoom_lobes * 2 / L)))
+    transform = ZoomFFT(L, [0, n_dense / freqResolution], m=n_dense, fs=2, endpoint=False)
+    first_coarse = int(np.ceil(n_dense * n_coarse / freqResolution))
+    frequencies = np.pi * np.concatenate((np.arange(n_dense) / freqResolution,
+                                          np.arange(first_coarse, n_coarse) / n_coarse))
+    frequencies.setflags(write=False)
+
+    return transform, n_coarse, first_coarse, frequencies
 
 class FireFly:
-    def __init__(self, Thread, L, beta, freqResolution, n_pop, max_iter, gamma, alpha, lamda):
-        self.Thread = Thread  
+    def __init__(self, L, beta, freqResolution, n_pop, max_iter, gamma, alpha, lamda, update_mode="async",
+                 response_engine="fft", seed=None, n_workers=1, progress_callback=None, cancel_token=None,
+                 mw_rec=None, stagnation_iter=None, target_pslr=None, max_evaluations=None, time_limit=None,
+                 min_freqResolution=None, fidelity_fraction=0.5, refine_peaks=False,
+                 interpolate_mw=False, precision="float64", memory_budget=default_memory_budget,
+                 profile=False, iteration_callback=None, checkpoint_path=None, checkpoint_interval=10,
+                 resume=False, engine="firefly", polish=False, warm_start=False, seed_windows=None,
+                 surrogate=False):
+        if update_mode not in update_modes:
+            raise ValueError(f"update_mode must be one of {update_modes}, got {update_mode!r}")
+        if response_engine not in response_engines:
+            raise ValueError(f"response_engine must be one of {response_engines}, got {response_engine!r}")
+        if precision not in precisions:
+            raise ValueError(f"precision must be one of {precisions}, got {precision!r}")
+        if engine not in search_engines:
+            raise ValueError(f"engine must be one of {search_engines}, got {engine!r}")
+        if n_workers > 1 and engine == "firefly" and update_mode == "async":
+            raise ValueError("n_workers > 1 needs update_mode='sync': the async firefly update evaluates one "
+                             "firefly at a time")
+        if freqResolution < min_points_per_sample * L:
+            raise ValueError(f"freqResolution must be at least {min_points_per_sample} * L = "
+                             f"{min_points_per_sample * L}, got {freqResolution}")
+        if engine == "direct" and checkpoint_path is not None:
+            raise ValueError("the direct engine has no iterations to checkpoint")
+        self.progress_callback = progress_callback
+        self.iteration_callback = iteration_callback
+        self.cancel_token = cancel_token
+        self.profile = profile
+        # PhaseProfiler of the running optimization and stats of the last one, see `profile_report`
+        self.profiler = None
+        self.profile_stats = None
         self.L = L  
         self.beta = beta 
         self.freqResolution = freqResolution 
@@ -16,27 +299,262 @@ class FireFly:
         self.gamma = gamma  
         self.alpha = alpha 
         self.lamda = lamda  
+        self.update_mode = update_mode
+        self.response_engine = response_engine
+        self.engine = engine
+        self.polish = polish
+        # Outcome of the last `polish_window`, see `run_report`
+        self.polish_report = None
+        self.warm_start = warm_start
+        # Windows of earlier designs (any length) seeding the population, see `cache.run_cached`
+        self.seed_windows = seed_windows or []
+        self.surrogate = surrogate
+        # `surrogate.SurrogateScreen` of the running optimization
+        self.screen = None
+        # Result of `direct_design`, computed once
+        self._direct_window = None
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.n_workers = n_workers
+        self.stagnation_iter = stagnation_iter
+        self.target_pslr = target_pslr
+        self.max_evaluations = max_evaluations
+        self.time_limit = time_limit
+        self.min_freqResolution = min_freqResolution
+        self.fidelity_fraction = fidelity_fraction
+        # Frequency grid used by `objective` and `objective_batch`, see `fidelity_resolution`
+        self.eval_resolution = freqResolution
+        self._reference_mw = {}
+        self.refine_peaks = refine_peaks
+        self.interpolate_mw = interpolate_mw
+        self.precision = precision
+        # Type of the population and fitness arrays of the search loop
+        self.dtype = np.dtype(precision)
+        self.memory_budget = memory_budget
+        # State file of `save_checkpoint`, written every `checkpoint_interval` iterations
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.resume = resume
+        self.n_evaluations = 0
+        self.start_time = None
+        self._window_buffer = np.zeros(L)
         self.window_rec = np.ones(L)
-        self.mw_rec = self.calculate_mw(self.window_rec)
+        # The reference mainlobe width only depends on L and freqResolution and can be shared between runs.
+        self.mw_rec = self.calculate_mw(self.window_rec) if mw_rec is None else mw_rec
 
         self.window = np.kaiser(L, beta)
         self.mw = self.calculate_mw(self.window)
 
-    def symmetric_window(self, window):
+    def get_params(self):
+        """
+        Returns the constructor arguments of this FireFly (without the
+        callbacks, cancellation token, profiling switch, checkpoint settings and
+        seed windows), so that an identical instance can be built in another process.
+        """
+        return dict(L=self.L, beta=self.beta, freqResolution=self.freqResolution, n_pop=self.n_pop,
+                    max_iter=self.max_iter, gamma=self.gamma, alpha=self.alpha, lamda=self.lamda,
+                    update_mode=self.update_mode, response_engine=self.response_engine,
+                    seed=self.seed, n_workers=self.n_workers, stagnation_iter=self.stagnation_iter,
+                    target_pslr=self.target_pslr, max_evaluations=self.max_evaluations, time_limit=self.time_limit,
+                    min_freqResolution=self.min_freqResolution, fidelity_fraction=self.fidelity_fraction,
+                    refine_peaks=self.refine_peaks, interpolate_mw=self.interpolate_mw,
+                    precision=self.precision, memory_budget=self.memory_budget, engine=self.engine,
+                    polish=self.polish, warm_start=self.warm_start, surrogate=self.surrogate)
+
+    @profiled("emit")
+    def report_progress(self, value):
+        """
+        Passes the progress of the optimization (in percent) to `progress_callback`.
+        """
+        if self.progress_callback is not None:
+            self.progress_callback(value)
+
+    @profiled("emit")
+    def report_iteration(self):
+        """
+        Passes the number of finished iterations, the best PSLR after each of
+        them (`history`) and the current best window to `iteration_callback`.
+        The history list keeps growing; copy it to keep a snapshot.
+        """
+        if self.iteration_callback is not None:
+            self.iteration_callback(self.n_iterations, self.history, self.symmetric_window(self.best_window))
+
+    def is_cancelled(self):
+        return self.cancel_token is not None and self.cancel_token.cancelled
+
+    def budget_exhausted(self):
+        """
+        Returns "max_evaluations" or "time_limit" once the evaluation budget or
+        the wall-clock deadline of the running optimization is used up, else None.
+        """
+        if self.max_evaluations is not None and self.n_evaluations >= self.max_evaluations:
+            return "max_evaluations"
+        if self.time_limit is not None and self.start_time is not None \
+                and time.perf_counter() - self.start_time >= self.time_limit:
+            return "time_limit"
+        return None
+
+    def check_stopping(self, population, fitness):
+        """
+        Records the PSLR of the brightest firefly in `history` (and the firefly
+        in `best_window`) and checks the stopping criteria:
+
+        - "target_pslr": the brightest firefly reaches `target_pslr` without a
+          wider mainlobe than the Kaiser window.
+        - "stagnation": the best PSLR so far did not improve by more than
+          `stagnation_tolerance_dB` in the last `stagnation_iter` iterations.
+        - "max_evaluations" and "time_limit", see `budget_exhausted`.
+
+        Returns:
+            The name of the criterion that fired, or None.
+        """
+        best, pslr, mw = self.best_metrics(population, fitness)
+        self.best_window = population[best]
+        self.history.append(pslr)
+
+        return self.stopping_reason(pslr, mw)
+
+    def best_metrics(self, population, fitness):
+        """
+        Returns the index of the brightest firefly (see `select_best`) and its
+        PSLR and mainlobe width on the full `freqResolution` grid.
+        """
+        best = self.select_best(population, fitness)
+        best_window = population[best][None, :]
+        pslr, mw = self.metrics_from_response_batch(self.calculate_response_batch(best_window), best_window,
+                                                    self.response_frequencies())
+        return best, pslr[0], mw[0]
+
+    def stopping_reason(self, pslr, mw):
+        """
+        Returns the stopping criterion of `check_stopping` that fires for a
+        best firefly of PSLR `pslr` and mainlobe width `mw`, already recorded
+        in `history`, or None.
+        """
+        _, mw_original = self.reference_mw(self.freqResolution)
+        if self.target_pslr is not None and pslr <= self.target_pslr and mw <= mw_original:
+            return "target_pslr"
+        if self.stagnation_iter is not None and len(self.history) > self.stagnation_iter:
+            best_before = min(self.history[:-self.stagnation_iter])
+            if best_before - min(self.history[-self.stagnation_iter:]) < stagnation_tolerance_dB:
+                return "stagnation"
+        return self.budget_exhausted()
+
+    def run_report(self):
+        """
+        Returns why and after how much work the last optimization stopped, with
+        `polish` the outcome of `polish_window` and with `surrogate` the
+        screening statistics (`surrogate.SurrogateScreen.report`).
+        """
+        report = {"stop_reason": self.stop_reason, "iterations": self.n_iterations,
+                  "evaluations": self.n_evaluations, "seconds": round(time.perf_counter() - self.start_time, 3)}
+        if self.polish_report is not None:
+            report["polish"] = self.polish_report
+        if self.screen is not None:
+            report["surrogate"] = self.screen.report()
+        return report
+
+    def save_checkpoint(self, population, fitness, t, engine_state):
+        """
+        Writes the state of the running optimization before iteration `t`
+        (population, fitness, the `engine_state` of `engines.SearchEngine.state`,
+        RNG state, history, counters and the state of the
+        `surrogate.SurrogateScreen`) to `checkpoint_path`, see `load_checkpoint`.
+
+        The file is replaced atomically, so an interruption while writing keeps
+        the previous checkpoint.
+        """
+        meta = {"params": self.get_params(), "iteration": t,
+                "rng_state": self.rng.bit_generator.state, "history": [float(pslr) for pslr in self.history],
+                "evaluations": self.n_evaluations, "eval_resolution": self.eval_resolution,
+                "seconds": time.perf_counter() - self.start_time}
+        screen_arrays = {}
+        if self.screen is not None:
+            screen_arrays, meta["surrogate"] = self.screen.state()
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.checkpoint_path)), suffix=".tmp")
+        with os.fdopen(handle, "wb") as file:
+            np.savez(file, population=population, fitness=fitness, meta=json.dumps(meta),
+                     **{"engine_" + name: value for name, value in engine_state.items()},
+                     **{"surrogate_" + name: array for name, array in screen_arrays.items()})
+        os.replace(temporary, self.checkpoint_path)
+
+    def load_checkpoint(self):
+        """
+        Restores the RNG state, history, counters and surrogate screen saved
+        by `save_checkpoint`.
+
+        Returns:
+            The population, fitness, the index of the next iteration and the
+            engine state (see `engines.SearchEngine.load_state`).
+
+        Raises:
+            ValueError: The checkpoint was written by a run with other parameters
+                (apart from `resumable_params`).
+        """
+        with np.load(self.checkpoint_path) as data:
+            population, fitness = data["population"], data["fitness"]
+            meta = json.loads(str(data["meta"]))
+            screen_arrays = {name[len("surrogate_"):]: data[name] for name in data.files
+                             if name.startswith("surrogate_")}
+            engine_state = {name[len("engine_"):]: data[name] for name in data.files if name.startswith("engine_")}
+
+        differing = sorted(name for name, value in self.get_params().items()
+                           if name not in resumable_params and meta["params"].get(name) != value)
+        if differing:
+            raise ValueError(f"checkpoint {self.checkpoint_path} was written with different parameters: "
+                             + ", ".join(differing))
+
+        self.rng.bit_generator.state = meta["rng_state"]
+        self.history = meta["history"]
+        self.n_evaluations = meta["evaluations"]
+        self.n_iterations = meta["iteration"]
+        self.eval_resolution = meta["eval_resolution"]
+        self.start_time -= meta["seconds"]
+        if self.screen is not None and "surrogate" in meta:
+            self.screen.load_state(screen_arrays, meta["surrogate"])
+
+        return population, fitness, meta["iteration"], engine_state
+
+    def phase(self, name):
+        """
+        Returns a context that records its body as phase `name` of the
+        profiler, or a shared no-op context when not profiling.
+        """
+        return _no_phase if self.profiler is None else self.profiler.phase(name)
+
+    def profile_report(self):
+        """
+        Returns the `PhaseProfiler.stats` of the running or last optimization,
+        or None if it was not profiled (`profile=False`).
+        """
+        if self.profiler is not None:
+            return self.profiler.stats(self.n_evaluations)
+        return self.profile_stats
+
+    def finish_profile(self):
+        """
+        Freezes the profile at the end of an optimization, so that later calls
+        (e.g. computing the final metrics) are not counted.
+        """
+        if self.profiler is not None:
+            self.profile_stats = self.profiler.stats(self.n_evaluations)
+            self.profiler = None
+
+    def symmetric_window(self, window, out=None):
         """
         Constructs a symmetric window function by mirroring the input window.
 
         This function creates a symmetric window by appending a reversed copy of
-        the input window to itself.
+        the input window to itself. If `out` is given, the result is written into
+        it instead of a newly allocated array.
 
         """
+        if out is None:
+            out = np.zeros(self.L)
+        out[:self.L // 2] = window
+        out[self.L // 2:] = window[::-1]
 
-        window_reversed = window[::-1]
-        window_symmetric = np.zeros(self.L)
-        window_symmetric[:self.L // 2] = window
-        window_symmetric[self.L // 2:] = window_reversed
-
-        return window_symmetric
+        return out
     
     def calculate_PL(self, window):
         """
@@ -54,23 +572,117 @@ class FireFly:
 
         return PL
     
-    def calculate_response(self, window):
+    @profiled("response")
+    def calculate_response(self, window, freqResolution=None):
         """
         Computes the frequency response of the given window.
 
         Args:
             window
+            freqResolution: Number of frequency points, by default `self.freqResolution`.
 
         Returns:
             frequencies_pi: Normalized frequency values.
             response: Magnitude response in dB.
         """
-        frequencies, response = freqz(window, self.freqResolution)
+        frequencies, response = freqz(window, worN=freqResolution or self.freqResolution)
         response = 20 * np.log10(np.abs(response) / np.max(np.abs(response)))
         frequencies_pi = frequencies / (2 * np.pi)
 
         return frequencies_pi, response
+
+    @profiled("response")
+    def calculate_response_batch(self, population, freqResolution=None):
+        """
+        Computes the magnitude responses of a whole population at once.
+
+        Every row of `population` is the first half of a symmetric window,
+        evaluated on the same frequency grid as `freqz` in `calculate_response`.
+        With `response_engine="fft"` the rows are mirrored and transformed with a
+        single 2-D real FFT. With `response_engine="cosine"` the real amplitude
+        responses are one matrix product with the cached `cosine_basis`, split
+        into blocks of frequencies when the basis does not fit into
+        `memory_budget` (see `basis_block_size`). With `response_engine="zoom"` only the band around the
+        mainlobe is evaluated on the full grid, the far sidelobes on a coarse one
+        (see `zoom_transform` and `response_frequencies`); on grids no finer than
+        the coarse one it falls back to the FFT. The FFT and cosine engines compute in the
+        precision of `population`, the zoom transform in float64.
+
+        Args:
+            population: Matrix of shape `(n, L/2)`, one half window per row.
+            freqResolution: Number of frequency points, by default `self.freqResolution`.
+
+        Returns:
+            Matrix with the magnitude responses in dB, one row per window and
+            one column per point of `response_frequencies(freqResolution)`.
+        """
+        freqResolution = freqResolution or self.freqResolution
+        if self.response_engine == "cosine":
+            block = self.basis_block_size()
+            if block >= freqResolution:
+                basis = cosine_basis(self.L, freqResolution, population.dtype, cache_bytes=self.basis_cache_bytes())
+                power = (population @ basis.T) ** 2
+            else:
+                power = np.empty((len(population), freqResolution), dtype=population.dtype)
+                for start in range(0, freqResolution, block):
+                    stop = min(start + block, freqResolution)
+                    basis = cosine_basis(self.L, freqResolution, population.dtype, start, stop, self.basis_cache_bytes())
+                    power[:, start:stop] = (population @ basis.T) ** 2
+            return 10 * np.log10(power / np.max(power, axis=1, keepdims=True))
+
+        windows = np.concatenate((population, population[:, ::-1]), axis=1)
+        if self.uses_zoom(freqResolution):
+            transform, n_coarse, first_coarse, _ = zoom_transform(self.L, freqResolution)
+            spectrum = np.concatenate((np.abs(transform(windows, axis=1)),
+                                       np.abs(np.fft.rfft(windows, n=2 * n_coarse, axis=1)[:, first_coarse:n_coarse])),
+                                      axis=1).astype(population.dtype, copy=False)
+            return 20 * np.log10(spectrum / np.max(spectrum, axis=1, keepdims=True))
+
+        n_fft = 2 * freqResolution
+        if windows.shape[1] > n_fft:
+            # Time-aliasing the windows keeps the n_fft point DFT exact.
+            pad = -windows.shape[1] % n_fft
+            windows = np.pad(windows, ((0, 0), (0, pad)))
+            windows = windows.reshape(len(windows), -1, n_fft).sum(axis=1)
+        spectrum = np.abs(np.fft.rfft(windows, n=n_fft, axis=1)[:, :freqResolution])
+        response = 20 * np.log10(spectrum / np.max(spectrum, axis=1, keepdims=True))
+
+        return response
     
+    def basis_block_size(self):
+        """
+        Returns the frequencies per block of `cosine_basis` whose construction
+        fits into a quarter of `memory_budget` (at least 3, see `_objective_cosine`).
+        """
+        return max(3, self.chunk_size(4 * cosine_bytes_per_coefficient * (self.L // 2)))
+
+    def basis_cache_bytes(self):
+        """
+        Returns the size limit of the `cosine_basis` cache: `cosine_cache_bytes`,
+        or a quarter of `memory_budget` if that is smaller.
+        """
+        if self.memory_budget is None:
+            return cosine_cache_bytes
+        return min(cosine_cache_bytes, int(self.memory_budget // 4))
+
+    def uses_zoom(self, freqResolution):
+        """
+        Whether `calculate_response_batch` evaluates `freqResolution` points
+        with the zoom transform, which only pays off on grids finer than its
+        coarse grid.
+        """
+        return self.response_engine == "zoom" and freqResolution > zoom_oversampling * self.L
+
+    def response_frequencies(self, freqResolution=None):
+        """
+        Returns the angular frequencies (rad/sample) of the points of the
+        responses of `calculate_response_batch`.
+        """
+        freqResolution = freqResolution or self.freqResolution
+        if self.uses_zoom(freqResolution):
+            return zoom_transform(self.L, freqResolution)[3]
+        return np.pi * np.arange(freqResolution) / freqResolution
+
     def calculate_pslr(self, window):
         """
         Calculates the Peak Side-Lobe Ratio (PSLR) for a given window function.
@@ -88,11 +700,65 @@ class FireFly:
             The highest peak side-lobe ratio.
         """
         _, response = self.calculate_response(window)
+        return self.pslr_from_response(response, window)
+
+    @profiled("peaks")
+    def pslr_from_response(self, response, window=None):
+        """
+        Extracts the sidelobe peaks and the PSLR from an already computed
+        magnitude response (in dB) of `window`.
+
+        With `refine_peaks` the PSLR is located between the grid points, see
+        `refine_peak_levels`; this needs `window`.
+        """
         peaks, _ = find_peaks(response)
         pslr = np.max(response[peaks])
+        if self.refine_peaks and window is not None:
+            top = peaks[np.argsort(response[peaks])[-refine_top_peaks:]]
+            levels = self.refine_peak_levels(window[None, :self.L // 2], np.pi * top[None, :] / len(response),
+                                             response[top][None, :], np.pi / len(response))
+            pslr = np.max(levels)
         return response[peaks], pslr
+
+    def refine_peak_levels(self, population, frequencies, levels, max_step):
+        """
+        Locates sidelobe maxima between the points of the frequency grid.
+
+        The amplitude response of a symmetric window is the cosine sum
+        A(w) = sum_k 2 h[k] cos(w m_k) with m_k = (L-1)/2 - k (see `cosine_basis`).
+        Starting from each peak, two Newton steps on A'(w) = 0, limited to
+        `max_step` (the grid spacing) each, find the local maximum of |A|, whose level relative to
+        A(0) is returned. Sampling the lobes on at least 2L points makes the PSLR
+        independent of the grid size.
+
+        Args:
+            population: Matrix of shape `(n, L/2)`, one half window per row.
+            frequencies: Matrix of shape `(n, k)`, angular frequencies of k peaks
+                per window.
+            levels: Matrix of shape `(n, k)`, levels of these peaks in dB
+                (-inf marks missing peaks).
+            max_step: Largest Newton step, scalar or of the shape of `frequencies`.
+
+        Returns:
+            Matrix of shape `(n, k)` with the refined levels in dB, never below `levels`.
+        """
+        m = (self.L - 1) / 2 - np.arange(self.L // 2)
+        h = 2 * population[:, None, :]
+        w = frequencies
+        for _ in range(2):
+            phase = w[..., None] * m
+            first = -np.sum(h * m * np.sin(phase), axis=-1)
+            second = -np.sum(h * m ** 2 * np.cos(phase), axis=-1)
+            step = -first / np.where(second == 0, np.inf, second)
+            w = w + np.clip(step, -max_step, max_step)
+
+        amplitude = np.sum(h * np.cos(w[..., None] * m), axis=-1)
+        with np.errstate(divide="ignore"):
+            refined = 20 * np.log10(np.abs(amplitude) / np.sum(h, axis=-1))
+
+        return np.where(np.isfinite(levels), np.maximum(refined, levels), levels)
     
-    def calculate_mw(self, window):
+    def calculate_mw(self, window, freqResolution=None):
         """
         Calculates the mean width (MW) of the mainlobe at a given threshold.
 
@@ -105,11 +771,20 @@ class FireFly:
 
         Args:
             window: The window function.
+            freqResolution: Number of frequency points, by default `self.freqResolution`.
 
         Returns:
             Mean width of the mainlobe or 0 in case of an error.
         """
-        _, response = self.calculate_response(window)
+        _, response = self.calculate_response(window, freqResolution)
+        return self.mw_from_response(response)
+
+    @profiled("mainlobe")
+    def mw_from_response(self, response):
+        """
+        Counts the samples of an already computed magnitude response (in dB)
+        that lie above `threshold_dB`. See `calculate_mw`.
+        """
         points = np.where(response >= threshold_dB)[0]
         mean_width = len(points)
         if len(points) > 1:
@@ -117,6 +792,166 @@ class FireFly:
         else:
             print("Error in calculate_mw")
             return 0
+
+    def calculate_mw_interpolated(self, window, freqResolution=None):
+        """
+        Calculates the mainlobe width from the -3 dB crossing frequency instead
+        of counting grid points, see `mw_crossing_batch`.
+
+        Args:
+            window: The window function.
+            freqResolution: Number of frequency points, by default `self.freqResolution`.
+
+        Returns:
+            mw: Mainlobe width in cycles/sample (0 in case of an error).
+            mw_bins: Mainlobe width in samples, as returned by `calculate_mw`.
+        """
+        _, response = self.calculate_response(window, freqResolution)
+        mw = self.mw_crossing_batch(response[None, :], window[None, :self.L // 2])[0]
+        return mw, self.mw_from_response(response)
+
+    def mw_crossing_batch(self, responses, population=None, frequencies=None):
+        """
+        Computes the mainlobe widths from the frequency where each response
+        first falls below `threshold_dB`.
+
+        The crossing is interpolated linearly in amplitude between the two grid
+        points around it. If the windows are given, two Newton steps on their
+        analytic amplitude response (see `cosine_basis`) then locate it
+        independently of the grid size.
+
+        Args:
+            responses: Matrix of magnitude responses in dB, one row per window.
+            population: The half windows the responses belong to.
+            frequencies: Angular frequencies of the response points, by default
+                the `freqz` grid.
+
+        Returns:
+            The two-sided width of every mainlobe in cycles/sample, 0 where the
+            mainlobe is not resolved (like `mw_from_response`).
+        """
+        n, freqResolution = responses.shape
+        if frequencies is None:
+            frequencies = np.pi * np.arange(freqResolution) / freqResolution
+        rows = np.arange(n)
+        below = responses < threshold_dB
+        crossing = np.argmax(below, axis=1)
+        found = below[rows, crossing] & (crossing > 1)
+        crossing = np.where(found, crossing, 1)
+
+        return self.mw_from_crossing(crossing, found, responses[rows, crossing - 1], responses[rows, crossing],
+                                     population, frequencies)
+
+    def mw_from_crossing(self, crossing, found, before, after, population, frequencies):
+        """
+        Interpolates the mainlobe widths of `mw_crossing_batch` from the index
+        `crossing` of the first point below `threshold_dB` of every response
+        (1 where not `found`) and the levels (dB) `before` and `after` it.
+        """
+        level = 10 ** (threshold_dB / 20)
+        before = 10 ** (before / 20)
+        after = 10 ** (after / 20)
+        bin_width = frequencies[crossing] - frequencies[crossing - 1]
+        w = frequencies[crossing - 1] + (before - level) / (before - after) * bin_width
+
+        if population is not None:
+            m = (self.L - 1) / 2 - np.arange(self.L // 2)
+            h = 2 * population
+            target = level * np.sum(h, axis=1)
+            for _ in range(2):
+                phase = w[:, None] * m
+                value = np.sum(h * np.cos(phase), axis=1) - target
+                slope = -np.sum(h * m * np.sin(phase), axis=1)
+                step = -value / np.where(slope == 0, np.inf, slope)
+                w = w + np.clip(step, -bin_width, bin_width)
+
+        return np.where(found, w / np.pi, 0)
+
+    def reference_mw(self, freqResolution):
+        """
+        Returns the mainlobe widths of the rectangular and the Kaiser window
+        (`mw_rec`, `mw`) on a grid of `freqResolution` points, computed once
+        per grid. With `interpolate_mw` they are the interpolated widths of
+        `calculate_mw_interpolated`.
+        """
+        if freqResolution == self.freqResolution and not self.interpolate_mw:
+            return self.mw_rec, self.mw
+        if freqResolution not in self._reference_mw:
+            if self.interpolate_mw:
+                self._reference_mw[freqResolution] = (
+                    self.calculate_mw_interpolated(self.window_rec, freqResolution)[0],
+                    self.calculate_mw_interpolated(self.window, freqResolution)[0])
+            else:
+                self._reference_mw[freqResolution] = (self.calculate_mw(self.window_rec, freqResolution),
+                                                      self.calculate_mw(self.window, freqResolution))
+        return self._reference_mw[freqResolution]
+
+    def calculate_metrics(self, window):
+        """
+        Computes PSLR, MW and PL of a window from a single frequency response.
+
+        `calculate_pslr` and `calculate_mw` each run `freqz`; this evaluates the
+        spectrum once and derives every metric from it.
+
+        Args:
+            window
+
+        Returns:
+            peaks: The values of the response at the sidelobe peaks.
+            pslr: The highest peak side-lobe ratio.
+            mw: Mainlobe width in samples.
+            pl: Processing loss.
+        """
+        _, response = self.calculate_response(window)
+        peaks, pslr = self.pslr_from_response(response, window)
+        mw = self.mw_from_response(response)
+        pl = self.calculate_PL(window)
+
+        return peaks, pslr, mw, pl
+
+    @profiled("peaks")
+    def metrics_from_response_batch(self, responses, population=None, frequencies=None):
+        """
+        Vectorized counterpart of `pslr_from_response` and `mw_from_response`.
+
+        Peaks are detected along the frequency axis of every row at once: a
+        sample is a peak if it is higher than its left neighbour and not lower
+        than its right one, so a flat peak is counted once. With `refine_peaks`
+        the `refine_top_peaks` highest peaks of each row are refined between the
+        grid points (see `refine_peak_levels`); this needs `population`. With
+        `interpolate_mw` the mainlobe widths come from `mw_crossing_batch`.
+
+        Args:
+            responses: Matrix of magnitude responses in dB, one row per window.
+            population: The half windows the responses belong to.
+            frequencies: Angular frequencies of the response points (see
+                `response_frequencies`), by default the `freqz` grid.
+
+        Returns:
+            pslr: The highest sidelobe peak of each row.
+            mw: Mainlobe width of each row in samples, or in cycles/sample with
+                `interpolate_mw` (0 if the mainlobe is not found).
+        """
+        centre = responses[:, 1:-1]
+        is_peak = (centre > responses[:, :-2]) & (centre >= responses[:, 2:])
+        levels = np.where(is_peak, centre, -np.inf)
+        if frequencies is None:
+            frequencies = np.pi * np.arange(responses.shape[1]) / responses.shape[1]
+        if self.refine_peaks and population is not None:
+            k = min(refine_top_peaks, levels.shape[1])
+            top = np.argpartition(levels, -k, axis=1)[:, -k:] + 1
+            spacing = np.diff(frequencies)
+            levels = self.refine_peak_levels(population, frequencies[top], np.take_along_axis(levels, top - 1, axis=1),
+                                             np.maximum(spacing[top - 1], spacing[top]))
+        pslr = np.max(levels, axis=1)
+
+        if self.interpolate_mw:
+            return pslr, self.mw_crossing_batch(responses, population, frequencies)
+
+        mw = np.count_nonzero(responses >= threshold_dB, axis=1)
+        mw[mw <= 1] = 0
+
+        return pslr, mw
         
     def objective(self, window):
         """
@@ -145,24 +980,317 @@ class FireFly:
         is designed to maximize the objective, while our goal is to minimize PSLR
         and maintain MW and PL within acceptable limits.
 
+        The response is evaluated on `eval_resolution` frequency points, the
+        current grid of the multi-fidelity schedule (see `fidelity_resolution`).
+
         Args:
             window
 
         Returns:
             float: The negative objective function value.
         """
+        if self.response_engine != "fft" or self.dtype != np.float64:
+            return self.objective_batch(window[None, :])[0]
 
-        window = self.symmetric_window(window)
-        peaks, pslr = self.calculate_pslr(window)
-        mw = self.calculate_mw(window)
+        self.n_evaluations += 1
+        window = self.symmetric_window(window, out=self._window_buffer)
+        _, response = self.calculate_response(window, self.eval_resolution)
+        _, pslr = self.pslr_from_response(response, window)
+        if self.interpolate_mw:
+            mw = self.mw_crossing_batch(response[None, :], window[None, :self.L // 2])[0]
+        else:
+            mw = self.mw_from_response(response)
+        mw_rec, mw_original = self.reference_mw(self.eval_resolution)
 
         objective = - pslr
 
-        if mw / self.mw_rec > self.mw / self.mw_rec:
-            objective -= self.lamda * abs(mw / self.mw_rec - self.mw / self.mw_rec)
+        if mw / mw_rec > mw_original / mw_rec:
+            objective -= self.lamda * abs(mw / mw_rec - mw_original / mw_rec)
 
         return objective
-    
+
+    def chunk_size(self, row_bytes):
+        """
+        Returns how many rows of `row_bytes` bytes of temporaries fit into
+        `memory_budget` (at least one; all of them without a budget).
+        """
+        if self.memory_budget is None:
+            return np.iinfo(np.intp).max
+        return max(1, int(self.memory_budget // row_bytes))
+
+    def objective_batch(self, population):
+        """
+        Computes the objective function value of every firefly in `population`.
+
+        Same objective as `objective`, evaluated for the whole population from
+        one batched FFT (`calculate_response_batch`) instead of one `freqz`
+        call per firefly. The population is processed in chunks whose
+        responses fit into `memory_budget`, so the memory does not grow with
+        the population size. The cosine engine then streams the basis instead,
+        see `_objective_cosine`.
+
+        Args:
+            population: Matrix of shape `(n, L/2)`, one half window per row.
+
+        Returns:
+            Vector of objective function values.
+        """
+        self.n_evaluations += len(population)
+        chunk = self.chunk_size(response_bytes_per_point * self.eval_resolution)
+        if chunk >= len(population):
+            return self._objective_chunk(population)
+        if self.response_engine == "cosine":
+            return self._objective_cosine(population)
+
+        objective = np.empty(len(population), dtype=population.dtype)
+        for start in range(0, len(population), chunk):
+            objective[start:start + chunk] = self._objective_chunk(population[start:start + chunk])
+
+        return objective
+
+    def _objective_chunk(self, population):
+        responses = self.calculate_response_batch(population, self.eval_resolution)
+        pslr, mw = self.metrics_from_response_batch(responses, population,
+                                                    self.response_frequencies(self.eval_resolution))
+        return self.objective_from_metrics(pslr, mw)
+
+    def objective_from_metrics(self, pslr, mw):
+        """
+        Returns the objective values (see `objective`) of windows with the
+        PSLRs `pslr` and mainlobe widths `mw` on the `eval_resolution` grid.
+        """
+        mw_rec, mw_original = self.reference_mw(self.eval_resolution)
+
+        objective = - pslr
+        mw_ratio = mw / mw_rec
+        mw_ratio_original = mw_original / mw_rec
+        penalized = mw_ratio > mw_ratio_original
+        objective[penalized] -= self.lamda * (mw_ratio[penalized] - mw_ratio_original)
+
+        return objective
+
+    def _objective_cosine(self, population):
+        """
+        Cosine-engine counterpart of the chunked loop of `objective_batch`.
+
+        The frequency blocks of the basis (see `basis_block_size`) are the
+        outer loop and the population chunks the inner one, so that every
+        block is built once per call even when the basis does not fit into the
+        cache. The metrics of `metrics_from_response_batch` are accumulated
+        block by block for every window: the highest sidelobe peaks (with two
+        levels carried over from the previous block, so that peaks on a block
+        edge are detected), the points above `threshold_dB` or the first one
+        below it. The dB levels are relative to the maximum of the first
+        block, the mainlobe of any sensible window; the few windows whose
+        maximum lies further up are evaluated again by `_objective_chunk`.
+
+        A quarter of `memory_budget` goes to building a basis block, a quarter
+        to the temporaries of a population chunk and at most a quarter to the
+        cached blocks (see `basis_cache_bytes`).
+        """
+        n, dtype = len(population), population.dtype
+        freqResolution = self.eval_resolution
+        frequencies = self.response_frequencies(freqResolution)
+        block = self.basis_block_size()
+        chunk = self.chunk_size(4 * response_bytes_per_point * min(block, freqResolution))
+
+        maximum = np.empty(n, dtype=dtype)
+        redo = np.zeros(n, dtype=bool)
+        tail = np.empty((n, 2), dtype=dtype)
+        k = min(refine_top_peaks, freqResolution - 2) if self.refine_peaks else 1
+        top_levels = np.full((n, k), -np.inf, dtype=dtype)
+        top_index = np.ones((n, k), dtype=np.intp)
+        count = np.zeros(n, dtype=np.intp)
+        crossing = np.full(n, -1, dtype=np.intp)
+        before, after = np.empty(n, dtype=dtype), np.empty(n, dtype=dtype)
+        head = np.empty((n, 2), dtype=dtype)
+
+        for start in range(0, freqResolution, block):
+            stop = min(start + block, freqResolution)
+            with self.phase("response"):
+                basis = cosine_basis(self.L, freqResolution, dtype, start, stop, self.basis_cache_bytes())
+            for first in range(0, n, chunk):
+                rows = slice(first, first + chunk)
+                with self.phase("response"):
+                    power = (population[rows] @ basis.T) ** 2
+                    if start == 0:
+                        maximum[rows] = np.max(power, axis=1)
+                    else:
+                        redo[rows] |= np.max(power, axis=1) > maximum[rows]
+                    responses = 10 * np.log10(power / maximum[rows, None])
+
+                with self.phase("peaks"):
+                    if start == 0:
+                        segment = responses
+                        head[rows] = responses[:, :2]
+                    else:
+                        segment = np.concatenate((tail[rows], responses), axis=1)
+                    carried = segment.shape[1] - responses.shape[1]
+                    tail[rows] = segment[:, -2:]
+
+                    centre = segment[:, 1:-1]
+                    levels = np.where((centre > segment[:, :-2]) & (centre >= segment[:, 2:]), centre, -np.inf)
+                    if self.refine_peaks:
+                        index = np.arange(start - carried + 1, stop - 1)
+                        levels = np.concatenate((top_levels[rows], levels), axis=1)
+                        index = np.concatenate((top_index[rows], np.broadcast_to(index, centre.shape)), axis=1)
+                        top = np.argpartition(levels, -k, axis=1)[:, -k:]
+                        top_levels[rows] = np.take_along_axis(levels, top, axis=1)
+                        top_index[rows] = np.take_along_axis(index, top, axis=1)
+                    else:
+                        top_levels[rows, 0] = np.maximum(top_levels[rows, 0], np.max(levels, axis=1))
+
+                    if self.interpolate_mw:
+                        below = responses < threshold_dB
+                        position = np.argmax(below, axis=1)
+                        new = np.flatnonzero(below[np.arange(len(below)), position] & (crossing[rows] < 0))
+                        crossing[first + new] = start + position[new]
+                        after[first + new] = responses[new, position[new]]
+                        before[first + new] = segment[new, np.maximum(position[new] + carried - 1, 0)]
+                    else:
+                        count[rows] += np.count_nonzero(responses >= threshold_dB, axis=1)
+
+        if self.refine_peaks:
+            spacing = np.diff(frequencies)
+            for first in range(0, n, chunk):
+                rows = slice(first, first + chunk)
+                top_levels[rows] = self.refine_peak_levels(population[rows], frequencies[top_index[rows]],
+                                                           top_levels[rows],
+                                                           np.maximum(spacing[top_index[rows] - 1],
+                                                                      spacing[top_index[rows]]))
+        pslr = np.max(top_levels, axis=1)
+
+        if self.interpolate_mw:
+            found = crossing > 1
+            crossing = np.where(found, crossing, 1)
+            before = np.where(found, before, head[:, 0])
+            after = np.where(found, after, head[:, 1])
+            mw = np.empty(n)
+            for first in range(0, n, chunk):
+                rows = slice(first, first + chunk)
+                mw[rows] = self.mw_from_crossing(crossing[rows], found[rows], before[rows], after[rows],
+                                                 population[rows], frequencies)
+        else:
+            mw = count
+            mw[mw <= 1] = 0
+
+        objective = self.objective_from_metrics(pslr, mw)
+        redo = np.flatnonzero(redo)
+        for first in range(0, len(redo), chunk):
+            rows = redo[first:first + chunk]
+            objective[rows] = self._objective_chunk(population[rows])
+
+        return objective
+
+    def direct_design(self):
+        """
+        Designs the minimax window directly, by linear programming.
+
+        For a stopband edge w_s, the program finds the half window h >= 0 with
+        A(0) = 1 (see `cosine_basis`) that minimizes the largest |A(w)| for
+        w >= w_s, subject to an amplitude that does not increase on [0, w_s]
+        and stays below -3 dB at the -3 dB crossing of the Kaiser window, so
+        that the mainlobe is not wider than the Kaiser one. The programs are
+        posed on the `freqz` grid of `calculate_response` (see
+        `minimax_window`) for `direct_edges` stopband edges, and the solution
+        with the best objective is kept.
+
+        Returns:
+            The half window, scaled to a maximum of 1. The Kaiser half window
+            if no program could be solved.
+        """
+        if self._direct_window is not None:
+            return self._direct_window
+
+        with self.phase("direct"):
+            kaiser = self.window[:self.L // 2]
+            _, response = self.calculate_response(self.window)
+            crossing = self.mw_crossing_batch(response[None, :], kaiser[None, :])[0] * np.pi
+            first = int(np.ceil(crossing * self.freqResolution / np.pi))
+            rising = np.flatnonzero(np.diff(response[first:]) > 0)
+            null = first + (rising[0] if len(rising) else 0)
+            edges = np.unique(np.linspace(first + 1, min(self.freqResolution - 2, 3 * null // 2),
+                                          direct_edges).astype(int))
+
+            candidates = [kaiser]
+            for edge in edges:
+                window = self.minimax_window(crossing, edge)
+                if window is not None:
+                    candidates.append(window)
+
+            resolution, self.eval_resolution = self.eval_resolution, self.freqResolution
+            fitness = self.objective_batch(np.array(candidates))
+            self.eval_resolution = resolution
+
+        self._direct_window = candidates[int(np.argmax(fitness))]
+        return self._direct_window
+
+    def minimax_window(self, crossing, edge):
+        """
+        Solves the linear program of `direct_design` for one stopband edge.
+
+        The sidelobe constraints of the whole stopband are added by exchange:
+        the program starts with `direct_initial_points` stopband frequencies
+        per window sample and, after every solution, adds the grid points where
+        the amplitude peaks above the current optimum, until there are none
+        (at most `direct_max_rounds` times). The result is the minimax
+        solution on the full grid from programs with a few rows per sidelobe.
+
+        Args:
+            crossing: Frequency (rad/sample) whose amplitude must stay below -3 dB.
+            edge: Index of the first stopband frequency in the `freqz` grid.
+
+        Returns:
+            The half window scaled to a maximum of 1, or None if the program
+            has no solution.
+        """
+        n = self.L // 2
+        N = self.freqResolution
+        m = (self.L - 1) / 2 - np.arange(n)
+        frequencies = np.pi * np.arange(N) / N
+        monotone = np.diff(2 * np.cos(np.outer(frequencies[:edge + 1], m)), axis=0)
+        mainlobe = 2 * np.cos(crossing * m)
+        # Variables: the half window and the peak sidelobe amplitude delta
+        A_fixed = np.vstack([np.hstack([monotone, np.zeros((edge, 1))]), np.append(mainlobe, 0)[None, :]])
+        b_fixed = np.append(np.zeros(edge), 10 ** (threshold_dB / 20))
+        A_eq = np.append(2 * np.ones(n), 0)[None, :]
+        c = np.append(np.zeros(n), 1)
+
+        active = np.arange(edge, N, max(1, N // (direct_initial_points * self.L)))
+        for _ in range(direct_max_rounds):
+            stopband = 2 * np.cos(np.outer(frequencies[active], m))
+            bound = np.ones((len(active), 1))
+            A_ub = np.vstack([np.hstack([stopband, -bound]), np.hstack([-stopband, -bound]), A_fixed])
+            b_ub = np.concatenate([np.zeros(2 * len(active)), b_fixed])
+            result = linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=[1], bounds=(0, None), method="highs-ipm")
+            if result.status != 0:
+                return None
+            window, delta = result.x[:n], result.x[n]
+
+            amplitude = np.abs(np.fft.rfft(self.symmetric_window(window), 2 * N)[edge:N])
+            peaks, _ = find_peaks(amplitude)
+            peaks = np.concatenate([[0, len(amplitude) - 1], peaks])
+            violated = edge + peaks[amplitude[peaks] > delta * (1 + 1e-9)]
+            violated = np.setdiff1d(violated, active)
+            if not len(violated):
+                break
+            active = np.union1d(active, violated)
+
+        return window / np.max(window)
+
+    def warm_start_windows(self):
+        """
+        Returns the half windows that replace the first random fireflies of
+        `initialize_fireflies`: the `direct_design` with `warm_start`, then the
+        `seed_windows` resampled to length L (see `resample_window`). At most
+        `warm_start_fraction` of the population is replaced, so that the rest
+        keeps its random diversity.
+        """
+        windows = [self.direct_design()] if self.warm_start else []
+        windows += [resample_window(window, self.L) for window in self.seed_windows]
+
+        return windows[:max(1, int(warm_start_fraction * self.n_pop))]
+
     def initialize_fireflies(self, window):
         """
         Initializes a population of fireflies for the Firefly Algorithm.  Eq.(2)
@@ -187,11 +1315,14 @@ class FireFly:
         Returns:
             matrix where each row represents an initialized firefly.
         """
-        fireflies = np.zeros((self.n_pop, self.L // 2))
+        fireflies = np.zeros((self.n_pop, self.L // 2), dtype=self.dtype)
 
         for k in range(self.n_pop):
-            fireflies[k] = window[:self.L // 2] + np.random.uniform(0, 1, self.L // 2)
+            fireflies[k] = window[:self.L // 2] + self.rng.uniform(0, 1, self.L // 2)
             fireflies[k] /= np.max(fireflies[k])
+        # Warm start; the random draws are the same with or without it.
+        for k, seed_window in enumerate(self.warm_start_windows()[:self.n_pop]):
+            fireflies[k] = seed_window
 
         return fireflies
     
@@ -216,8 +1347,197 @@ class FireFly:
         alpha *= (1 - delta)
 
         return alpha
-    
-    
+
+    def random_steps(self, t, start, stop):
+        """
+        Draws the uniform [0, 1) random vectors of fireflies `start` to `stop` for
+        iteration `t` of the synchronous update.
+
+        With a seed, the population is split into blocks of `rng_block_size`
+        fireflies and every block has its own stream seeded by `(seed, t, block)`,
+        so the draws do not depend on how the population is sharded across worker
+        processes. Without a seed the draws come from `self.rng`.
+        """
+        if self.seed is None:
+            return self.rng.uniform(0, 1, (stop - start, self.L // 2))
+
+        first, last = start // rng_block_size, -(-stop // rng_block_size)
+        steps = np.concatenate([
+            np.random.default_rng((self.seed, t, block)).uniform(0, 1, (rng_block_size, self.L // 2))
+            for block in range(first, last)])
+        offset = start - first * rng_block_size
+
+        return steps[offset:offset + stop - start]
+
+    @profiled("move")
+    def move_fireflies(self, population, fitness, alpha, t=0, start=0, stop=None):
+        """
+        Moves every firefly towards the brighter ones in a single synchronous step. Eq.(5)-(7)
+
+        Unlike the sequential update in `optimizer`, brightness is compared against
+        the fitness at the start of the iteration and all moves are applied at once
+        as matrix operations. The pairwise squared distances come from the Gram
+        matrix, |x_i - x_j|^2 = |x_i|^2 + |x_j|^2 - 2 x_i.x_j. The moves of a firefly
+        towards all of its brighter neighbours are averaged, so a firefly with many
+        brighter neighbours does not overshoot, and it receives one random step.
+        The fireflies are moved in chunks whose distance matrices fit into
+        `memory_budget`.
+
+        Args:
+            population: Matrix of shape `(n, L/2)`, one half window per row.
+            fitness: Objective function value of every firefly.
+            alpha: Randomization parameter.
+            t: Iteration index, selects the random streams (see `random_steps`).
+            start, stop: Only fireflies `start` to `stop` are moved, against the
+                whole population. Used to shard the step across processes.
+
+        Returns:
+            The moved fireflies `start` to `stop`, clipped to [0, 1], in the
+            precision of the search loop (`dtype`).
+        """
+        stop = len(population) if stop is None else stop
+        chunk = self.chunk_size(move_bytes_per_pair * len(population))
+        if chunk >= stop - start:
+            return self._move_chunk(population, fitness, alpha, t, start, stop)
+
+        moved = np.empty((stop - start, self.L // 2), dtype=self.dtype)
+        for first in range(start, stop, chunk):
+            last = min(first + chunk, stop)
+            moved[first - start:last - start] = self._move_chunk(population, fitness, alpha, t, first, last)
+
+        return moved
+
+    def _move_chunk(self, population, fitness, alpha, t, start, stop):
+        rows = population[start:stop]
+        squared_norms = np.einsum("ij,ij->i", population, population)
+        r2 = squared_norms[start:stop, None] + squared_norms[None, :] - 2 * rows @ population.T  # Eq.(6)
+        np.maximum(r2, 0, out=r2)
+        attraction = self.beta * np.exp(- self.gamma * r2)  # Eq.(5)
+        brighter = fitness[None, :] > fitness[start:stop, None]
+        attraction *= brighter
+
+        n_brighter = brighter.sum(axis=1)
+        moved = n_brighter > 0
+        step = attraction @ population - attraction.sum(axis=1)[:, None] * rows
+        step[moved] /= n_brighter[moved, None]
+        noise = alpha * (self.random_steps(t, start, stop) - 0.5)
+        rows = rows + step + noise * moved[:, None]  # Eq.(7)
+
+        return np.clip(rows, 0, 1).astype(self.dtype, copy=False)
+
+    def fidelity_resolution(self, t):
+        """
+        Returns the frequency grid on which candidates are evaluated in iteration `t`.
+
+        Without `min_freqResolution` this is always `freqResolution`. Otherwise
+        the grid starts at `min_freqResolution` (at least `min_points_per_sample`
+        * L points, so that the mainlobe of the rectangular window spans several
+        samples) and doubles in equal steps until it reaches `freqResolution`
+        after `fidelity_fraction` of the iterations.
+        """
+        coarsest = max(self.min_freqResolution or self.freqResolution, min_points_per_sample * self.L)
+        ramp = max(1, int(self.fidelity_fraction * self.max_iter))
+        if coarsest >= self.freqResolution or t >= ramp:
+            return self.freqResolution
+
+        n_levels = int(np.ceil(np.log2(self.freqResolution / coarsest)))
+        level = t * (n_levels + 1) // ramp
+
+        return min(self.freqResolution, coarsest * 2 ** level)
+
+    def evaluate(self, population, evaluator=None):
+        """
+        Returns the objective function value of every firefly in `population`,
+        through `evaluator` (a `parallel.ParallelEvaluator`) if given.
+        """
+        if evaluator is None:
+            return self.objective_batch(population)
+        self.n_evaluations += len(population)
+        with self.phase("workers"):
+            return evaluator.evaluate(population, self.eval_resolution)
+
+    def select_best(self, population, fitness):
+        """
+        Returns the index of the best firefly.
+
+        On a coarse grid of the multi-fidelity schedule, or when the search
+        runs in float32, the `elite_fraction` brightest fireflies are
+        re-evaluated in float64 at the full `freqResolution` and the best of
+        them is returned.
+        """
+        if self.eval_resolution == self.freqResolution and self.dtype == np.float64:
+            return int(np.argmax(fitness))
+
+        elite = np.argsort(fitness)[-max(1, int(elite_fraction * len(population))):]
+        resolution, self.eval_resolution = self.eval_resolution, self.freqResolution
+        elite_fitness = self.objective_batch(population[elite].astype(np.float64))
+        self.eval_resolution = resolution
+
+        return int(elite[np.argmax(elite_fitness)])
+
+    def iterate(self, population, fitness, alpha, t, evaluator=None):
+        """
+        Performs iteration `t` of the Firefly Algorithm on `population`.
+
+        Args:
+            population: Matrix of shape `(n, L/2)`, one half window per row.
+            fitness: Objective function value of every firefly.
+            alpha: Randomization parameter.
+            t: Iteration index.
+            evaluator: Optional `parallel.ParallelEvaluator` for the sync mode.
+
+        When the multi-fidelity schedule moves to a finer grid in iteration `t`,
+        the population is re-evaluated on it first.
+
+        With `surrogate`, the async mode does not evaluate moves that the
+        `surrogate.SurrogateScreen` predicts to be clearly worse than the
+        current firefly, and drops them.
+
+        Returns:
+            The updated population and fitness. The async mode updates both in
+            place and stops early once `budget_exhausted`.
+        """
+        resolution = self.fidelity_resolution(t)
+        if resolution != self.eval_resolution:
+            self.eval_resolution = resolution
+            fitness = self.evaluate(population, evaluator)
+            if self.screen is not None:
+                self.screen.reset(population, fitness)
+
+        if self.update_mode == "sync" and evaluator is not None:
+            self.n_evaluations += len(population)
+            with self.phase("workers"):
+                return evaluator.step(population, fitness, alpha, t, self.eval_resolution)
+        if self.update_mode == "sync":
+            population = self.move_fireflies(population, fitness, alpha, t)
+            return population, self.objective_batch(population)
+
+        for i in range(len(population)):
+            if self.budget_exhausted() is not None:
+                break
+            for j in range(len(population)):
+                if fitness[j] > fitness[i]:
+                    with self.phase("move"):
+                        r = np.linalg.norm(population[i] - population[j])  # Eq.(6)
+                        attraction = self.beta * np.exp(- self.gamma * r ** 2)  # Eq.(5)
+                        candidate = population[i] + (attraction * (population[j] - population[i]) + alpha * (
+                                    self.rng.uniform(0, 1, self.L // 2) - 0.5))  # Eq.(7)
+                        candidate = np.clip(candidate.astype(population.dtype, copy=False), 0, 1)
+                    if self.screen is None:
+                        population[i] = candidate
+                        fitness[i] = self.objective(candidate)
+                        continue
+                    with self.phase("surrogate"):
+                        decision = self.screen.decide(candidate, fitness[i])
+                    if decision == "skip":
+                        continue
+                    value = self.objective(candidate)
+                    with self.phase("surrogate"):
+                        self.screen.record(candidate, value, decision, fitness[i])
+                    population[i], fitness[i] = candidate, value
+
+        return population, fitness
+
     def optimizer(self):
         """
         Implements the Firefly Algorithm for window optimization.
@@ -232,39 +1552,170 @@ class FireFly:
             beta: Attraction coefficient.
             gamma: Light absorption coefficient.
 
+        With `update_mode="async"` (the reference behaviour) every firefly moves
+        and is re-evaluated as soon as a brighter one is found. With
+        `update_mode="sync"` the whole population moves at once against the
+        start-of-iteration fitness, see `move_fireflies`. With `n_workers > 1`
+        (sync mode or another `engine` only) the evaluations and the sync moves
+        are sharded across a pool of processes, see `parallel.ParallelEvaluator`. With `min_freqResolution`
+        early iterations evaluate candidates on coarser frequency grids, see
+        `fidelity_resolution` and `select_best`. With `precision="float32"` the
+        search loop runs in single precision and the final pick and the
+        returned window are float64.
+
+        The run ends after `max_iter` iterations or earlier when one of the
+        stopping criteria fires (see `check_stopping`). Afterwards
+        `stop_reason`, `n_iterations`, `n_evaluations` and `history` (the PSLR
+        of the brightest firefly after every iteration) describe the run, see
+        also `run_report`. `iteration_callback` receives them after every
+        iteration, see `report_iteration`. With `profile=True` the time of
+        every phase of the run is recorded, see `PhaseProfiler` and
+        `profile_report`. With another `engine` than "firefly" the same
+        objective is searched by particle swarm, differential evolution,
+        CMA-ES or linear programming; every engine runs in the loop of
+        `engines.SearchEngine.run`.
+
+        With `checkpoint_path` the state of the search is saved every
+        `checkpoint_interval` iterations, when the run stops and when it is
+        cancelled (see `save_checkpoint`). With `resume=True` a run continues
+        from that checkpoint, if it exists, exactly as if it had not been
+        interrupted. A cancelled run returns the best window found so far.
+
         Returns:
             The optimized window function.
         """
-        self.Thread.progress.emit(0)
-        population = self.initialize_fireflies(self.window)
-        fitness = np.array([self.objective(ind) for ind in population])
-        alpha = self.alpha
-
-        for t in range(self.max_iter):
-            if self.Thread._is_running:
-                for i in range(self.n_pop):
-                    for j in range(self.n_pop):
-                        if fitness[j] > fitness[i]:
-                            r = np.linalg.norm(population[i] - population[j])  # Eq.(6)
-                            attraction = self.beta * np.exp(- self.gamma * r ** 2)  # Eq.(5)
-                            population[i] += attraction * (population[j] - population[i]) + alpha * (
-                                        np.random.uniform(0, 1, self.L // 2) - 0.5)  # Eq.(7)
-                            population[i] = np.clip(population[i], 0, 1)
-                            fitness[i] = self.objective(population[i])
-            else:
-                return self.window, self.window
-            alpha = self.new_alpha(alpha)
-            self.Thread.progress.emit(round(((t + 1) / self.max_iter) * 100, 2))
-        
-        best_index = np.argmax(fitness)
-        self.window_optimized = population[best_index]
+        from engines import make_engine
+
+        run = make_engine(self).run
+        try:
+            if self.n_workers > 1:
+                from parallel import ParallelEvaluator
+
+                with ParallelEvaluator(self, self.n_workers) as evaluator:
+                    return run(evaluator)
+            return run(None)
+        finally:
+            self.finish_profile()
+
+    def start_run(self):
+        """
+        Resets the run report, history and profiler before an optimization.
+        """
+        self.profiler = PhaseProfiler() if self.profile else None
+        self.profile_stats = None
+        self.start_time = time.perf_counter()
+        self.n_evaluations = 0
+        self.n_iterations = 0
+        self.history = []
+        self.stop_reason = None
+        self.polish_report = None
+        self.screen = None
+        if self.surrogate and self.update_mode == "async" and self.engine == "firefly":
+            from surrogate import SurrogateScreen
+
+            self.screen = SurrogateScreen(None if self.seed is None else [self.seed, 1])
+        self.report_progress(0)
+
+    def finish_run(self, population, fitness, best_index=None):
+        """
+        Picks the best firefly of the final population (`best_index`, if
+        already known from `select_best`) as `window_optimized` and, with
+        `polish`, refines it with `polish_window` unless the run was cancelled.
+
+        Returns:
+            The standard and the optimized window, as returned by `optimizer`.
+        """
+        if best_index is None:
+            best_index = self.select_best(population, fitness)
+        self.window_optimized = population[best_index].astype(np.float64)
+        if self.polish and self.stop_reason != "cancelled":
+            self.window_optimized = self.polish_window(self.window_optimized)
         return self.window, self.symmetric_window(self.window_optimized)
-    
+
+    def polish_window(self, window):
+        """
+        Refines a half window with a quasi-Newton method (SLSQP) on a smooth
+        surrogate of its PSLR.
+
+        The surrogate is a soft maximum (log-sum-exp) of the sidelobe levels in
+        dB, sampled at `polish_oversampling` points per window sample beyond the
+        first null. Its gradient is analytic, from the cosine representation
+        of the amplitude response (see `cosine_basis`). The mainlobe must not
+        get wider: the response at the -3 dB crossing of the Kaiser window (or
+        of `window`, if that one is wider) stays below -3 dB, a linear
+        constraint. The soft maximum is sharpened over the stages of
+        `polish_sharpness`, each starting from the result of the previous one.
+
+        The polished window is kept only if it improves the objective on the
+        full `freqResolution` grid. `polish_report` records the PSLR before and
+        after, the surrogate evaluations (also counted in `n_evaluations`) and
+        whether the result was kept.
+
+        Args:
+            window: Half window of length L/2.
+
+        Returns:
+            The polished half window, or `window` if polishing did not help.
+        """
+        with self.phase("polish"):
+            window = np.asarray(window, dtype=np.float64)
+            n_points = min(self.freqResolution, polish_oversampling * self.L)
+            basis = cosine_basis(self.L, n_points)
+            frequencies = np.pi * np.arange(n_points) / n_points
+            m = (self.L - 1) / 2 - np.arange(self.L // 2)
+
+            halves = np.stack([self.window[:self.L // 2], window])
+            amplitude = np.abs(halves @ basis.T)
+            responses = 20 * np.log10(np.maximum(amplitude / amplitude[:, :1], 1e-12))
+            crossing = np.max(self.mw_crossing_batch(responses, halves, frequencies)) * np.pi
+            # The sidelobes start at the first minimum of the amplitude beyond the crossing.
+            start = np.searchsorted(frequencies, crossing)
+            rising = np.flatnonzero(np.diff(amplitude[1, start:]) > 0)
+            sidelobes = basis[start + (rising[0] if len(rising) else 0):]
+
+            level = 10 ** (threshold_dB / 20)
+            crossing_row = 2 * level - 2 * np.cos(crossing * m)
+            constraint = {"type": "ineq", "fun": lambda h: crossing_row @ h, "jac": lambda h: crossing_row}
+            evaluations = 0
+
+            def surrogate(h, sharpness):
+                nonlocal evaluations
+                evaluations += 1
+                amplitude = sidelobes @ h
+                peak = 2 * np.sum(h)
+                power = amplitude ** 2 + (1e-12 * peak) ** 2
+                levels = 10 * np.log10(power / peak ** 2)
+                highest = np.max(levels)
+                weights = np.exp(sharpness * (levels - highest))
+                total = np.sum(weights)
+                weights /= total
+                gradient = 20 / np.log(10) * ((weights * amplitude / power) @ sidelobes - 2 / peak)
+                return highest + np.log(total) / sharpness, gradient
+
+            polished = window
+            for sharpness in polish_sharpness:
+                result = minimize(surrogate, polished, args=(sharpness,), jac=True, method="SLSQP",
+                                  bounds=[(0, 1)] * len(window), constraints=[constraint],
+                                  options={"maxiter": polish_max_iter})
+                polished = np.clip(result.x, 0, 1)
+            self.n_evaluations += evaluations
+
+            resolution, self.eval_resolution = self.eval_resolution, self.freqResolution
+            before, after = self.objective_batch(np.stack([window, polished]))
+            self.eval_resolution = resolution
+
+        accepted = bool(after > before)
+        self.polish_report = {"pslr_before": float(self.calculate_pslr(self.symmetric_window(window))[1]),
+                              "pslr_after": float(self.calculate_pslr(self.symmetric_window(polished))[1]),
+                              "evaluations": evaluations, "accepted": accepted}
+        return polished if accepted else window
+
     def calculate_MW_PSLR_PL(self, window):
 
-        mw = self.calculate_mw(window)
-        _, pslr = self.calculate_pslr(window)
-        pl = self.calculate_PL(window)
+        _, pslr, mw, pl = self.calculate_metrics(window)
+        if self.interpolate_mw:
+            mw_rec, _ = self.reference_mw(self.freqResolution)
+            return round(self.calculate_mw_interpolated(window)[0]/mw_rec, 2), round(pslr, 2), round(pl, 2)
         return round(mw/self.mw_rec, 2), round(pslr, 2), round(pl, 2)
 
     def calculate_H(self, window):
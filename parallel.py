@@ -0,0 +1,115 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import optimizer as opt
+
+# Shared arrays of the evaluator, all of shape (n_pop, L/2) or (n_pop,) and of the FireFly's dtype
+shared_arrays = ("population", "fitness", "population_next", "fitness_next")
+
+# State of a worker process, filled in by `_init_worker`
+_worker = {}
+
+
+def _init_worker(params, names, shapes):
+    """
+    Builds the worker's own FireFly from the constructor arguments of the
+    parent's one and maps the shared population and fitness arrays.
+    """
+    _worker["firefly"] = opt.FireFly(**dict(params, n_workers=1))
+    _worker["shm"] = []
+    for key, name, shape in zip(shared_arrays, names, shapes):
+        shm = shared_memory.SharedMemory(name=name)
+        _worker["shm"].append(shm)
+        _worker[key] = np.ndarray(shape, dtype=_worker["firefly"].dtype, buffer=shm.buf)
+
+
+def _evaluate(start, stop, resolution):
+    firefly = _worker["firefly"]
+    firefly.eval_resolution = resolution
+    _worker["fitness"][start:stop] = firefly.objective_batch(_worker["population"][start:stop])
+
+
+def _move_and_evaluate(start, stop, alpha, t, resolution):
+    firefly = _worker["firefly"]
+    firefly.eval_resolution = resolution
+    moved = firefly.move_fireflies(_worker["population"], _worker["fitness"], alpha, t, start, stop)
+    _worker["population_next"][start:stop] = moved
+    _worker["fitness_next"][start:stop] = firefly.objective_batch(moved)
+
+
+class ParallelEvaluator:
+    """
+    Shards the objective evaluations (and the synchronous firefly moves) of a
+    FireFly across a pool of worker processes.
+
+    The population and fitness arrays live in shared memory: for every call
+    only the shard bounds are sent to the workers, which read the population
+    and write their fitness values in place. Shards are aligned to
+    `optimizer.rng_block_size`, so with a seed the random streams, and with
+    them the results, are identical for any number of workers.
+
+    Use it as a context manager, or call `close` to stop the workers and
+    release the shared memory.
+    """
+
+    def __init__(self, firefly, n_workers):
+        self.n_pop = firefly.n_pop
+        shapes = [(firefly.n_pop, firefly.L // 2), (firefly.n_pop,)] * 2
+        self._shm = []
+        self.arrays = {}
+        for key, shape in zip(shared_arrays, shapes):
+            shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * firefly.dtype.itemsize))
+            self._shm.append(shm)
+            self.arrays[key] = np.ndarray(shape, dtype=firefly.dtype, buffer=shm.buf)
+
+        n_blocks = -(-self.n_pop // opt.rng_block_size)
+        self.shards = [(blocks[0] * opt.rng_block_size, min((blocks[-1] + 1) * opt.rng_block_size, self.n_pop))
+                       for blocks in np.array_split(np.arange(n_blocks), min(n_workers, n_blocks))]
+
+        self.pool = ProcessPoolExecutor(
+            max_workers=len(self.shards),
+            initializer=_init_worker,
+            initargs=(firefly.get_params(), [shm.name for shm in self._shm], shapes))
+
+    def _run(self, function, *args):
+        futures = [self.pool.submit(function, start, stop, *args) for start, stop in self.shards]
+        for future in futures:
+            future.result()
+
+    def evaluate(self, population, resolution):
+        """
+        Returns the objective function value of every firefly in `population`,
+        evaluated on `resolution` frequency points.
+        """
+        self.arrays["population"][:] = population
+        self._run(_evaluate, resolution)
+        return self.arrays["fitness"].copy()
+
+    def step(self, population, fitness, alpha, t, resolution):
+        """
+        Performs one synchronous firefly iteration (see `FireFly.move_fireflies`)
+        and evaluates the moved population on `resolution` frequency points.
+
+        Returns:
+            The moved population and its fitness.
+        """
+        self.arrays["population"][:] = population
+        self.arrays["fitness"][:] = fitness
+        self._run(_move_and_evaluate, alpha, t, resolution)
+        return self.arrays["population_next"].copy(), self.arrays["fitness_next"].copy()
+
+    def close(self):
+        self.pool.shutdown()
+        self.arrays.clear()
+        for shm in self._shm:
+            shm.close()
+            shm.unlink()
+        self._shm = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
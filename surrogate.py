@@ -0,0 +1,174 @@
+import numpy as np
+
+# Most recent (window, fitness) pairs the model is fitted to
+surrogate_archive_size = 50
+# True evaluations before the model is used, and between two refits
+surrogate_min_points = 20
+surrogate_refit_interval = 5
+# Ridge added to the interpolation matrix of the model
+surrogate_smoothing = 1e-8
+# A candidate is skipped if its predicted fitness is this much (dB) below the current one
+surrogate_margin_dB = 1.0
+# Share of the skipped candidates evaluated anyway, to measure the mis-rank rate
+surrogate_audit_fraction = 0.1
+# Counters of `SurrogateScreen.state`, besides its arrays
+_state_counters = ("n_points", "position", "new_points", "screened", "skipped", "audited", "misranked")
+
+
+class SurrogateScreen:
+    """
+    Radial basis function model of the objective, trained online on the
+    evaluated (half window, fitness) pairs of an optimization, that pre-screens
+    the moves of the asynchronous firefly update (see `FireFly.iterate`).
+
+    The model interpolates the last `surrogate_archive_size` evaluations with
+    the linear kernel phi(r) = -r plus a constant, which needs no shape
+    parameter and is well posed in any dimension. The archive is a ring
+    buffer: a new evaluation overwrites the oldest one and only its row and
+    column of the interpolation matrix, so that refitting every
+    `surrogate_refit_interval` evaluations is a single small linear solve.
+
+    A moved firefly whose predicted fitness is more than `surrogate_margin_dB`
+    below its current fitness is not evaluated and the move is dropped.
+    `surrogate_audit_fraction` of these candidates are evaluated (and moved)
+    anyway; the share of them that were not actually worse is the mis-rank
+    rate of `report`.
+
+    Args:
+        seed: Seed of the audit draws.
+    """
+
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.centers = None
+        self.values = np.zeros(surrogate_archive_size)
+        # Interpolation matrix: row and column 0 hold the constant term, k + 1 the archive slot k.
+        self.system = np.zeros((surrogate_archive_size + 1, surrogate_archive_size + 1))
+        self.system[0, 1:] = self.system[1:, 0] = 1
+        self.model = None
+        self.n_points = 0
+        self.position = 0
+        self.new_points = 0
+        self.screened = 0
+        self.skipped = 0
+        self.audited = 0
+        self.misranked = 0
+
+    def reset(self, population, fitness):
+        """
+        Restarts the model from the evaluated `population`, e.g. when the
+        objective changed with the frequency grid.
+        """
+        population = np.asarray(population, dtype=np.float64)[-surrogate_archive_size:]
+        self.centers = np.zeros((surrogate_archive_size, population.shape[1]))
+        self.n_points = self.position = 0
+        self.model = None
+        for window, value in zip(population, np.asarray(fitness)[-surrogate_archive_size:]):
+            self.add(window, value)
+        self.fit()
+
+    def add(self, window, value):
+        """
+        Stores an evaluation in the archive, over the oldest one once it is full.
+        """
+        k = self.position
+        self.centers[k] = window
+        self.values[k] = value
+        self.n_points = min(self.n_points + 1, surrogate_archive_size)
+        self.position = (k + 1) % surrogate_archive_size
+        distances = np.sqrt(np.sum((self.centers[:self.n_points] - self.centers[k]) ** 2, axis=1))
+        self.system[k + 1, 1:self.n_points + 1] = self.system[1:self.n_points + 1, k + 1] = -distances
+        self.system[k + 1, k + 1] = surrogate_smoothing
+        self.new_points += 1
+
+    def decide(self, candidate, current):
+        """
+        Returns "evaluate", "skip" or "audit" (evaluate a candidate the model
+        would skip) for moving a firefly of fitness `current` to `candidate`.
+        """
+        if self.model is None:
+            return "evaluate"
+        self.screened += 1
+        if self.predict(candidate) >= current - surrogate_margin_dB:
+            return "evaluate"
+        if self.rng.random() < surrogate_audit_fraction:
+            self.audited += 1
+            return "audit"
+        self.skipped += 1
+        return "skip"
+
+    def record(self, candidate, value, decision="evaluate", current=None):
+        """
+        Adds a true evaluation to the archive, refits the model when due and
+        counts a mis-ranked audit.
+        """
+        if decision == "audit" and value >= current:
+            self.misranked += 1
+        self.add(candidate, value)
+        if self.model is None or self.new_points >= surrogate_refit_interval:
+            self.fit()
+
+    def fit(self):
+        """
+        Fits the model to the archive once it holds `surrogate_min_points` pairs.
+        """
+        n = self.n_points
+        if n < surrogate_min_points:
+            return
+        system = self.system[:n + 1, :n + 1]
+        values = np.concatenate(([0], self.values[:n]))
+        try:
+            coefficients = np.linalg.solve(system, values)
+        except np.linalg.LinAlgError:
+            coefficients = np.linalg.lstsq(system, values, rcond=None)[0]
+        centers = self.centers[:n].copy()
+        self.model = (centers, np.sum(centers ** 2, axis=1), coefficients)
+        self.new_points = 0
+
+    def predict(self, candidate):
+        """
+        Returns the predicted fitness of the half window `candidate`.
+        """
+        centers, squared, coefficients = self.model
+        candidate = candidate.astype(np.float64, copy=False)
+        distances = np.sqrt(np.maximum(squared - 2 * (centers @ candidate) + candidate @ candidate, 0))
+        return coefficients[0] - distances @ coefficients[1:]
+
+    def state(self):
+        """
+        Returns the archive, model, counters and audit RNG state as a dict of
+        arrays and a JSON-serializable dict, see `load_state`.
+        """
+        arrays = {"centers": self.centers, "values": self.values}
+        if self.model is not None:
+            arrays.update(model_centers=self.model[0], model_coefficients=self.model[2])
+        meta = {name: getattr(self, name) for name in _state_counters}
+        meta["rng_state"] = self.rng.bit_generator.state
+        return arrays, meta
+
+    def load_state(self, arrays, meta):
+        """
+        Restores the state returned by `state`.
+        """
+        self.centers = np.array(arrays["centers"])
+        self.values = np.array(arrays["values"])
+        for name in _state_counters:
+            setattr(self, name, meta[name])
+        self.rng.bit_generator.state = meta["rng_state"]
+        self.system[1:, 1:] = 0
+        for k in range(self.n_points):
+            distances = np.sqrt(np.sum((self.centers[:self.n_points] - self.centers[k]) ** 2, axis=1))
+            self.system[k + 1, 1:self.n_points + 1] = -distances
+            self.system[k + 1, k + 1] = surrogate_smoothing
+        self.model = None
+        if "model_centers" in arrays:
+            centers = np.array(arrays["model_centers"])
+            self.model = (centers, np.sum(centers ** 2, axis=1), np.array(arrays["model_coefficients"]))
+
+    def report(self):
+        """
+        Returns the candidates screened by the model, the true evaluations it
+        saved, the audited candidates and the share of them it mis-ranked.
+        """
+        return {"screened": self.screened, "saved_evaluations": self.skipped, "audited": self.audited,
+                "misrank_rate": round(self.misranked / self.audited, 4) if self.audited else None}
@@ -0,0 +1,190 @@
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import optimizer as opt
+from cache import ResultCache, run_cached
+
+# Columns of the result table, in order
+result_columns = ("L", "beta", "lamda", "gamma", "alpha", "freqResolution", "n_pop", "max_iter", "seed",
+                  "mw", "pslr", "pl", "mw_optimized", "pslr_optimized", "pl_optimized", "stop_reason", "iterations", "evaluations", "seconds", "window")
+
+
+def sweep_jobs(lengths, betas, lamdas, gammas, alphas, **params):
+    """
+    Expands the parameter grids into one FireFly parameter dict per job.
+
+    Jobs are ordered by window length.
+
+    Args:
+        lengths, betas, lamdas, gammas, alphas: Grid values of each parameter.
+        params: Remaining `FireFly` arguments, common to all jobs.
+    """
+    return [dict(params, L=L, beta=beta, lamda=lamda, gamma=gamma, alpha=alpha)
+            for L, beta, lamda, gamma, alpha in itertools.product(sorted(lengths), betas, lamdas, gammas, alphas)]
+
+
+def _run_job(params, cache_dir, use_cache, warm_start_designs):
+    start = time.perf_counter()
+    firefly_algorithm = opt.FireFly(**params)
+    entry, _ = run_cached(firefly_algorithm, ResultCache(cache_dir) if use_cache else None,
+                          warm_start_designs=warm_start_designs)
+    mw, pslr, pl = entry["metrics"]["kaiser"]
+    mw_optimized, pslr_optimized, pl_optimized = entry["metrics"]["optimized"]
+
+    row = {key: params.get(key) for key in result_columns[:9]}
+    row.update(mw=mw, pslr=pslr, pl=pl, mw_optimized=mw_optimized, pslr_optimized=pslr_optimized,
+               pl_optimized=pl_optimized, stop_reason=entry["report"]["stop_reason"],
+               iterations=entry["report"]["iterations"], evaluations=entry["report"]["evaluations"], seconds=round(time.perf_counter() - start, 3),
+               window=" ".join(f"{value:.6g}" for value in entry["window_optimized"]))
+
+    return row
+
+
+def _run_batch(batch, cache_dir, use_cache, warm_start_designs):
+    return [_run_job(params, cache_dir, use_cache, warm_start_designs) for params in batch]
+
+
+def job_batches(jobs, n_workers=None):
+    """
+    Splits `jobs` into batches of the same `(L, freqResolution)`, so that the
+    jobs of a batch run one after another in one worker and reuse its spectral
+    bases (`optimizer.cosine_basis`, `optimizer.zoom_transform`).
+
+    A combination is split into at most `n_workers` batches of about the same
+    size, so that a sweep over a single window length still uses every worker.
+
+    Args:
+        jobs: Parameter dicts of `sweep_jobs`.
+        n_workers: Processes of the pool (default: all cores).
+    """
+    groups = {}
+    for job in jobs:
+        groups.setdefault((job["L"], job["freqResolution"]), []).append(job)
+    n_workers = n_workers or os.cpu_count() or 1
+
+    batches = []
+    for group in groups.values():
+        size = -(-len(group) // n_workers)
+        batches += [group[k:k + size] for k in range(0, len(group), size)]
+    return batches
+
+
+def run_sweep(jobs, output, n_workers=None, progress_callback=None, cancel_token=None, cache_dir=None,
+              use_cache=True, warm_start_designs=0):
+    """
+    Runs the optimizations of `jobs` in a pool of `n_workers` processes.
+
+    The reference mainlobe width `mw_rec` is computed once per
+    `(L, freqResolution)` and handed to every job with that combination. The
+    jobs are submitted in batches of the same combination (see `job_batches`),
+    so every worker builds the spectral bases of a combination once per batch
+    instead of once per job. The results of a batch are appended to the CSV
+    file `output` (columns `result_columns`) as soon as the batch completes,
+    so a partial sweep keeps everything finished; a cancelled sweep still
+    finishes the batches already running. Designs already in the result cache
+    (see `cache.ResultCache`) are not optimized again. With
+    `warm_start_designs`, every job seeds its population with that many
+    finished designs of the nearest window length and beta from the cache
+    (see `cache.run_cached`).
+
+    Returns:
+        The result rows in completion order.
+    """
+    mw_rec = {}
+    for job in jobs:
+        key = (job["L"], job["freqResolution"])
+        if key not in mw_rec:
+            mw_rec[key] = opt.FireFly(**dict(job, n_workers=1)).mw_rec
+    jobs = [dict(job, n_workers=1, mw_rec=mw_rec[job["L"], job["freqResolution"]]) for job in jobs]
+
+    rows = []
+    new_file = not os.path.exists(output) or os.path.getsize(output) == 0
+    with open(output, "a", newline="") as file, ProcessPoolExecutor(max_workers=n_workers) as pool:
+        writer = csv.DictWriter(file, fieldnames=result_columns)
+        if new_file:
+            writer.writeheader()
+
+        pending = {pool.submit(_run_batch, batch, cache_dir, use_cache, warm_start_designs)
+                   for batch in job_batches(jobs, n_workers)}
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                for row in future.result():
+                    writer.writerow(row)
+                    rows.append(row)
+                file.flush()
+            if progress_callback is not None and done:
+                progress_callback(round(len(rows) / len(jobs) * 100, 2))
+            if cancel_token is not None and cancel_token.cancelled:
+                for future in pending:
+                    future.cancel()
+                break
+
+    return rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Optimize Kaiser windows over a grid of parameters.")
+    parser.add_argument("--window-length", type=int, nargs="+", default=[64])
+    parser.add_argument("--beta", type=float, nargs="+", default=[2.25])
+    parser.add_argument("--lambda", dest="lamda", type=float, nargs="+", default=[10])
+    parser.add_argument("--gamma", type=float, nargs="+", default=[0.15])
+    parser.add_argument("--alpha", type=float, nargs="+", default=[0.1])
+    parser.add_argument("--freq-resolution", type=int, default=1024)
+    parser.add_argument("--min-freq-resolution", type=int, default=None)
+    parser.add_argument("--refine-peaks", action="store_true")
+    parser.add_argument("--interpolate-mw", action="store_true")
+    parser.add_argument("--precision", choices=opt.precisions, default="float64")
+    parser.add_argument("--memory-budget", type=float, default=opt.default_memory_budget / 2 ** 20, help="MiB per process")
+    parser.add_argument("--fireflies", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--engine", choices=opt.search_engines, default="firefly")
+    parser.add_argument("--polish", action="store_true")
+    parser.add_argument("--warm-start", action="store_true")
+    parser.add_argument("--surrogate", action="store_true")
+    parser.add_argument("--warm-start-designs", type=int, default=0,
+                        help="seed every job with this many finished designs of the nearest L and beta")
+    parser.add_argument("--update-mode", choices=opt.update_modes, default="async")
+    parser.add_argument("--response-engine", choices=opt.response_engines, default="fft")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--stagnation-iter", type=int, default=None)
+    parser.add_argument("--target-pslr", type=float, default=None)
+    parser.add_argument("--max-evaluations", type=int, default=None)
+    parser.add_argument("--time-limit", type=float, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--cache-dir", default=None, help="result cache directory (default: $KAISER_CACHE_DIR)")
+    parser.add_argument("--no-cache", action="store_true", help="always optimize, do not read or write the cache")
+    parser.add_argument("--output", default=os.path.join(os.getenv("SAVE_DIR", "./"), "sweep.csv"))
+    args = parser.parse_args(argv)
+
+    if any(L <= 0 or L % 2 == 1 for L in args.window_length):
+        parser.error("window lengths must be positive and even.")
+    if args.freq_resolution < opt.min_points_per_sample * max(args.window_length):
+        parser.error(f"freq_resolution must be at least {opt.min_points_per_sample} * window_length.")
+
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    jobs = sweep_jobs(args.window_length, args.beta, args.lamda, args.gamma, args.alpha,
+                      freqResolution=args.freq_resolution, n_pop=args.fireflies, max_iter=args.iterations,
+                      update_mode=args.update_mode, response_engine=args.response_engine, engine=args.engine,
+                      polish=args.polish, warm_start=args.warm_start, surrogate=args.surrogate, seed=args.seed,
+                      stagnation_iter=args.stagnation_iter, target_pslr=args.target_pslr,
+                      max_evaluations=args.max_evaluations, time_limit=args.time_limit,
+                      min_freqResolution=args.min_freq_resolution, refine_peaks=args.refine_peaks,
+                      interpolate_mw=args.interpolate_mw, precision=args.precision,
+                      memory_budget=int(args.memory_budget * 2 ** 20))
+    rows = run_sweep(jobs, args.output, n_workers=args.workers, cache_dir=args.cache_dir, use_cache=not args.no_cache,
+                     warm_start_designs=args.warm_start_designs,
+                     progress_callback=lambda value: print(f"\rProcessing: {value}%", end="", file=sys.stderr))
+    print(file=sys.stderr)
+    best = min(rows, key=lambda row: row["pslr_optimized"])
+    print(f"{len(rows)} designs written to {args.output}; lowest PSLR {best['pslr_optimized']} dB "
+          f"at L={best['L']}, beta={best['beta']}")